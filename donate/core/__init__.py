@@ -5,6 +5,8 @@ from django.utils.translation.trans_real import accept_language_re
 
 from . import translation   # noqa F401
 
+default_app_config = 'donate.core.apps.CoreConfig'
+
 
 # WARNING: this is not necessarily a good idea, but is the only way to override
 # Django's default behaviour of requiring language codes to be lowercased.
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+
+from .db import check_persistent_connections
+
+
+class CoreConfig(AppConfig):
+    name = 'donate.core'
+    label = 'core'
+
+    def ready(self):
+        if settings.DATABASE_CONN_HEALTH_CHECKS:
+            request_started.connect(check_persistent_connections, dispatch_uid='check_persistent_connections')
@@ -0,0 +1,12 @@
+from django.db import connections
+
+
+def check_persistent_connections(**kwargs):
+    """
+    Close persistent connections that no longer work, for example after a database
+    failover, so that the request opens a new one instead of failing on its first query.
+    Connected to request_started when DATABASE_CONN_HEALTH_CHECKS is set.
+    """
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
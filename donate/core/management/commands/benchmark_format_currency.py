@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from donate.core.templatetags.util_tags import format_currency, get_currency_formatter, get_currency_patterns
+
+
+class Command(BaseCommand):
+    help = (
+        'Time formatting every preset amount in every currency, as a donation page does, '
+        'with and without the cached currency formatters.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--language', default='en-US')
+        parser.add_argument('--pages', type=int, default=200)
+
+    def format_page(self, language_code):
+        for currency_code, info in settings.CURRENCIES.items():
+            for amounts in info['presets'].values():
+                for amount in amounts:
+                    format_currency(language_code, currency_code, amount)
+
+    def time_pages(self, language_code, pages, cached):
+        start = time.perf_counter()
+        for _ in range(pages):
+            if not cached:
+                get_currency_formatter.cache_clear()
+                get_currency_patterns.cache_clear()
+            self.format_page(language_code)
+        return (time.perf_counter() - start) / pages * 1000
+
+    def handle(self, *args, **options):
+        uncached = self.time_pages(options['language'], options['pages'], cached=False)
+        cached = self.time_pages(options['language'], options['pages'], cached=True)
+        self.stdout.write(f'Uncached: {uncached:.2f}ms per page')
+        self.stdout.write(f'Cached: {cached:.2f}ms per page ({uncached / cached:.1f}x faster)')
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils.text import compress_string
+
+from wagtail.core.models import Page
+
+from donate.core import page_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Time gzipping a donation page for every response, as GZipMiddleware does, '
+        'against building the response from the deflated parts in the page cache.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('page_id', type=int)
+        parser.add_argument('--requests', type=int, default=200)
+
+    def time_requests(self, requests, compress):
+        start = time.perf_counter()
+        for _ in range(requests):
+            compress()
+        return (time.perf_counter() - start) / requests * 1000
+
+    def handle(self, *args, **options):
+        page = Page.objects.get(pk=options['page_id']).specific
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        content = page_cache.render_with_placeholders(request, lambda: Page.serve(page, request)).content
+        deflated_parts = page_cache.deflate_parts(content)
+
+        middleware = self.time_requests(
+            options['requests'], lambda: compress_string(page_cache.fill_placeholders(content, request))
+        )
+        cached = self.time_requests(
+            options['requests'], lambda: page_cache.gzip_content(content, deflated_parts, request)
+        )
+        self.stdout.write(f'GZipMiddleware: {middleware:.3f}ms per response')
+        self.stdout.write(f'Page cache: {cached:.3f}ms per response')
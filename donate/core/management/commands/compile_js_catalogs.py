@@ -0,0 +1,31 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import translation
+from django.utils.translation.trans_real import DjangoTranslation
+from django.views.i18n import JavaScriptCatalog
+
+from donate.core.templatetags.util_tags import JS_CATALOG_DIR
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the JavaScript translation catalog for each language to the frontend build, '
+        'so collectstatic can serve it as a versioned static file.'
+    )
+
+    def handle(self, *args, **options):
+        output_dir = os.path.join(settings.STATICFILES_DIRS[0], JS_CATALOG_DIR)
+        os.makedirs(output_dir, exist_ok=True)
+
+        for language_code, _ in settings.LANGUAGES:
+            # The catalog includes the active language's date and number formats
+            with translation.override(language_code):
+                catalog = JavaScriptCatalog()
+                catalog.translation = DjangoTranslation(language_code, domain='djangojs')
+                response = catalog.render_to_response(catalog.get_context_data())
+            with open(os.path.join(output_dir, f'{language_code}.js'), 'wb') as f:
+                f.write(response.content)
+
+        self.stdout.write(f'Wrote {len(settings.LANGUAGES)} catalogs to {output_dir}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from donate.core.queues import get_queue_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the depth and latency of each priority RQ queue.'
+
+    def handle(self, *args, **options):
+        for name, stats in get_queue_stats().items():
+            self.stdout.write(
+                f"{name}: {stats['depth']} waiting, oldest for {stats['latency']:.1f}s, "
+                f"{stats['scheduled']} scheduled, {stats['failed']} failed"
+            )
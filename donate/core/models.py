@@ -1,14 +1,21 @@
 from copy import deepcopy
 from decimal import Decimal, InvalidOperation
+import hashlib
+import json
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.dispatch import receiver
 from django.utils.functional import cached_property
+from django.utils.html import json_script
 
 from wagtail.admin.edit_handlers import FieldPanel, InlinePanel, StreamFieldPanel
 from wagtail.core.blocks import DecimalBlock, StreamBlock
 from wagtail.core.fields import RichTextField, StreamField
 from wagtail.core.models import Page
+from wagtail.core.signals import page_published, page_unpublished
 from wagtail.images.edit_handlers import ImageChooserPanel
 
 from modelcluster.fields import ParentalKey
@@ -18,7 +25,16 @@ from donate.payments import constants
 from donate.payments import utils
 from donate.payments.forms import BraintreePaypalPaymentForm, CurrencyForm
 
+from . import page_cache
 from .blocks import ContentBlock
+from .utils import forget_donation_page
+
+CURRENCIES_CACHE_PREFIX = 'donation_page:currencies'
+CURRENCIES_CACHE_TIMEOUT = 60 * 60 * 24 * 7  # seconds
+# Part of the cache key, so that a deploy that changes settings.CURRENCIES doesn't serve stale presets
+CURRENCIES_DIGEST = hashlib.md5(
+    json.dumps(constants.CURRENCIES, sort_keys=True, cls=DjangoJSONEncoder).encode('utf-8')
+).hexdigest()[:12]
 
 
 class DonationPage(Page):
@@ -51,8 +67,7 @@ class DonationPage(Page):
         SynchronizedField('campaign_id'),
     ]
 
-    @cached_property
-    def currencies(self):
+    def build_currencies(self):
         currencies = deepcopy(constants.CURRENCIES)
         # Re-order currency `single` and `monthly` amounts
         for currency in currencies:
@@ -60,6 +75,33 @@ class DonationPage(Page):
             currencies[currency]['presets']['monthly'].sort()
         return currencies
 
+    def get_revision_cached(self, name, build):
+        """
+        Return the result of build(), built once per live revision and shared through
+        the cache, so publishing the page replaces it.
+        """
+        if not self.live_revision_id:
+            return build()
+
+        cache_key = f'{CURRENCIES_CACHE_PREFIX}:{name}:{CURRENCIES_DIGEST}:{self.pk}:{self.live_revision_id}'
+        value = cache.get(cache_key)
+        if value is None:
+            value = build()
+            cache.set(cache_key, value, CURRENCIES_CACHE_TIMEOUT)
+        return value
+
+    @cached_property
+    def currencies(self):
+        """
+        The currency table with this page's presets. Treat it as read-only.
+        """
+        return self.get_revision_cached('table', self.build_currencies)
+
+    @cached_property
+    def currencies_json_script(self):
+        # The <script> element that the currency selector reads the table from, encoded and escaped once
+        return self.get_revision_cached('json_script', lambda: json_script(self.currencies, 'currencies'))
+
     def get_initial_currency(self, request):
         # Query argument takes first preference
         if request.GET.get('currency') in constants.CURRENCIES:
@@ -69,12 +111,24 @@ class DonationPage(Page):
         return utils.get_default_currency(getattr(request, 'LANGUAGE_CODE', ''))
 
     def serve(self, request, *args, **kwargs):
-        response = super().serve(request, *args, **kwargs)
+        if settings.PAGE_CACHE_ENABLED and page_cache.is_cacheable(request):
+            response = page_cache.serve_cached(self, request, lambda: super(DonationPage, self).serve(
+                request, *args, **kwargs
+            ))
+        else:
+            response = super().serve(request, *args, **kwargs)
+
         if request.GET.get('subscribed') == '1':
             # Set a cookie that expires at the end of the session
             response.set_cookie('subscribed', '1', httponly=True)
         return response
 
+    def serve_preview(self, request, mode_name):
+        # A preview can have preset overrides that aren't published yet, so skip the cache
+        self.currencies = self.build_currencies()
+        self.currencies_json_script = json_script(self.currencies, 'currencies')
+        return super().serve_preview(request, mode_name)
+
     def get_initial_frequency(self, request):
         frequency = request.GET.get('frequency', '')
         return frequency if frequency in dict(constants.FREQUENCY_CHOICES) else constants.FREQUENCY_SINGLE
@@ -112,6 +166,8 @@ class DonationPage(Page):
         if sorting == 'reverse':
             custom_presets.sort(reverse=True)
 
+        # self.currencies is shared between requests, so copy before changing the presets
+        initial_currency_info = dict(initial_currency_info, presets=dict(initial_currency_info['presets']))
         initial_currency_info['presets'][initial_frequency] = custom_presets[:4]
         return initial_currency_info
 
@@ -179,16 +235,23 @@ class DonationPage(Page):
     def get_context(self, request):
         ctx = super().get_context(request)
         values = self.get_initial_values(request)
+        landing_url = request.build_absolute_uri()
+        if getattr(request, 'page_cache_render', False):
+            # Rendering for the page cache, which fills these in for each response
+            landing_url = page_cache.LANDING_URL_PLACEHOLDER
+            ctx['csrf_token'] = page_cache.CSRF_TOKEN_PLACEHOLDER
+
         ctx.update({
             'use_paypal': settings.USE_PAYPAL,
             'currencies': self.currencies,
+            'currencies_json_script': self.currencies_json_script,
             'initial_currency_info': values['currency_info'],
             'initial_frequency': values['frequency'],
             'initial_amount': values['amount'],
             'braintree_params': settings.BRAINTREE_PARAMS,
             'braintree_form': BraintreePaypalPaymentForm(
                 initial={
-                    'landing_url': request.build_absolute_uri(),
+                    'landing_url': landing_url,
                     'project': self.project,
                     'campaign_id': self.campaign_id,
                 }
@@ -276,9 +339,8 @@ class CampaignPage(DonationPage):
             'monthly': cls.amount_stream_to_list(override.monthly_options),
         }
 
-    @cached_property
-    def currencies(self):
-        currencies = super().currencies
+    def build_currencies(self):
+        currencies = super().build_currencies()
         # Apply overrides for preset options
         for override in self.donation_amounts.all():
             currencies[override.currency]['presets'] = self.get_presets(override)
@@ -358,3 +420,11 @@ class ContributorSupportPage(Page):
             'help_recaptcha_site_key': settings.RECAPTCHA_SITE_KEY_REGULAR if settings.USE_RECAPTCHA else None,
         })
         return ctx
+
+
+# Signals rather than the after_publish_page hook, so that scheduled publishing is covered too
+@receiver(page_published)
+@receiver(page_unpublished)
+def purge_page_cache(sender, instance, **kwargs):
+    page_cache.purge_page(instance)
+    forget_donation_page(instance.pk)
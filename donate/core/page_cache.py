@@ -0,0 +1,214 @@
+"""
+Full-page cache for anonymous visitors to donation pages.
+
+A donation page only varies by language, host and a few query parameters, apart
+from three per-request values: the CSP nonce, the CSRF token and the landing URL
+that is sent to Braintree. Pages are rendered with placeholders for those, the
+result is cached, and the real values are filled in for every response.
+
+The parts of the page between the placeholders are also cached deflated, so a gzip
+response is put together from them without compressing the whole page again.
+"""
+import hashlib
+import re
+import struct
+from uuid import uuid4
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.html import escape
+
+PAGE_CACHE_PREFIX = 'page_cache'
+# The only query parameters that change how a donation page renders
+PAGE_CACHE_PARAMS = ('amount', 'currency', 'form_id', 'frequency', 'presets', 'sort')
+MESSAGES_COOKIE_NAME = 'messages'
+
+NONCE_PLACEHOLDER = 'page-cache-csp-nonce-placeholder'
+CSRF_TOKEN_PLACEHOLDER = 'page-cache-csrf-token-placeholder'
+LANDING_URL_PLACEHOLDER = 'page-cache-landing-url-placeholder'
+PLACEHOLDER_RE = re.compile(b'(%s)' % b'|'.join(
+    re.escape(placeholder.encode('utf-8'))
+    for placeholder in (NONCE_PLACEHOLDER, CSRF_TOKEN_PLACEHOLDER, LANDING_URL_PLACEHOLDER)
+))
+
+# ID, compression method (deflate), flags, mtime, extra flags and OS (unknown)
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+# An empty final block, which ends a deflate stream
+DEFLATE_END = b'\x03\x00'
+
+
+def is_cacheable(request):
+    """
+    Only anonymous visitors without a session can share a cached page: anyone else may
+    have messages, analytics events or an A/B test variant to see.
+    """
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        and not request.COOKIES.get(MESSAGES_COOKIE_NAME)
+        and not getattr(request, 'wagtail_ab_testing_test', None)
+    )
+
+
+def get_generation(page):
+    """
+    Every cached variant of a page includes this token in its key, so replacing it
+    purges them all at once.
+    """
+    key = f'{PAGE_CACHE_PREFIX}:generation:{page.pk}'
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid4().hex
+        cache.set(key, generation, None)
+    return generation
+
+
+def purge_page(page):
+    cache.set(f'{PAGE_CACHE_PREFIX}:generation:{page.pk}', uuid4().hex, None)
+
+
+def get_cache_key(page, request):
+    params = '&'.join(
+        f'{name}={request.GET[name].strip()}' for name in PAGE_CACHE_PARAMS if request.GET.get(name)
+    )
+    variant = hashlib.md5(
+        f'{request.get_host()}|{getattr(request, "LANGUAGE_CODE", "")}|{params}'.encode('utf-8')
+    ).hexdigest()
+    return f'{PAGE_CACHE_PREFIX}:{page.pk}:{get_generation(page)}:{variant}'
+
+
+def render_with_placeholders(request, serve):
+    """
+    Call serve() and render its response with placeholders for the per-request values.
+    DonationPage.get_context checks request.page_cache_render.
+    """
+    nonce = getattr(request, 'csp_nonce', None)
+    request.csp_nonce = NONCE_PLACEHOLDER
+    request.page_cache_render = True
+    try:
+        response = serve()
+        if hasattr(response, 'render'):
+            response.render()
+    finally:
+        del request.page_cache_render
+        if nonce is None:
+            del request.csp_nonce
+        else:
+            request.csp_nonce = nonce
+    return response
+
+
+PLACEHOLDER_VALUES = {
+    # Reading request.csp_nonce is what makes django-csp add the nonce to the header
+    NONCE_PLACEHOLDER.encode('utf-8'): lambda request: str(getattr(request, 'csp_nonce', '')),
+    CSRF_TOKEN_PLACEHOLDER.encode('utf-8'): get_token,
+    LANDING_URL_PLACEHOLDER.encode('utf-8'): lambda request: escape(request.build_absolute_uri()),
+}
+
+
+class PlaceholderValues(dict):
+    """
+    The value of each placeholder for a request, worked out the first time the page
+    needs it. Calling get_token() makes CsrfViewMiddleware set the CSRF cookie, which
+    pages without a form shouldn't get.
+    """
+
+    def __init__(self, request):
+        super().__init__()
+        self.request = request
+
+    def __missing__(self, placeholder):
+        value = self[placeholder] = PLACEHOLDER_VALUES[placeholder](self.request).encode('utf-8')
+        return value
+
+
+def get_placeholder_values(request):
+    return PlaceholderValues(request)
+
+
+def fill_placeholders(content, request):
+    values = get_placeholder_values(request)
+    return PLACEHOLDER_RE.sub(lambda match: values[match.group()], content)
+
+
+def deflate(data, level=zlib.Z_BEST_COMPRESSION):
+    """
+    Return data as raw deflate blocks that end on a byte boundary and don't end the
+    stream, so that they can be joined to other blocks.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def deflate_parts(content):
+    """
+    Deflate each part of content between placeholders on its own. Compressed this way, the
+    per-request values can't share back-references with the rest of the page, so the length
+    of the response can't be used to guess a CSRF token or nonce (the BREACH attack).
+    """
+    return [deflate(part) for part in PLACEHOLDER_RE.split(content)[::2]]
+
+
+def gzip_content(content, deflated_parts, request):
+    """
+    Return content with its placeholders filled in, as a gzip file built from deflated_parts.
+    """
+    values = get_placeholder_values(request)
+    parts = PLACEHOLDER_RE.split(content)
+    body = [GZIP_HEADER]
+    crc = size = 0
+    for index, part in enumerate(parts):
+        if index % 2:
+            part = values[part]
+            body.append(deflate(part, zlib.Z_DEFAULT_COMPRESSION))
+        else:
+            body.append(deflated_parts[index // 2])
+        crc = zlib.crc32(part, crc)
+        size += len(part)
+    body.append(DEFLATE_END)
+    body.append(struct.pack('<II', crc, size & 0xffffffff))
+    return b''.join(body)
+
+
+def set_content(response, content, deflated_parts, request):
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        response.content = gzip_content(content, deflated_parts, request)
+        # GZipMiddleware leaves responses with a Content-Encoding alone
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response.content = fill_placeholders(content, request)
+
+
+def serve_cached(page, request, serve):
+    """
+    Return the cached page for this request, calling serve() to render and cache it
+    if there isn't one yet.
+    """
+    cache_key = get_cache_key(page, request)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        response = HttpResponse()
+        set_content(response, *cached, request)
+        response['X-Page-Cache'] = 'hit'
+        return response
+
+    response = render_with_placeholders(request, serve)
+    if response.streaming:
+        # The placeholders can't be filled in on a stream, so render it again without them
+        return serve()
+
+    if response.status_code == 200 and not response.cookies:
+        content = response.content
+        deflated_parts = deflate_parts(content)
+        cache.set(cache_key, (content, deflated_parts), settings.PAGE_CACHE_TIMEOUT)
+        set_content(response, content, deflated_parts, request)
+        response['X-Page-Cache'] = 'miss'
+    else:
+        response.content = fill_placeholders(response.content, request)
+    return response
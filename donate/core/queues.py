@@ -0,0 +1,73 @@
+"""
+RQ queue topology. Workers listen on QUEUE_NAMES in order, and RQ always takes the
+next job from the first queue that has one, so payment work on 'high' never waits
+behind a backlog on 'normal' or 'low'.
+"""
+from datetime import datetime
+
+import django_rq
+
+QUEUE_HIGH = 'high'
+QUEUE_NORMAL = 'normal'
+QUEUE_LOW = 'low'
+QUEUE_NAMES = (QUEUE_HIGH, QUEUE_NORMAL, QUEUE_LOW)
+
+# Queue for each task function, by dotted path. Anything not listed goes on QUEUE_NORMAL.
+TASK_ROUTES = {
+    # Gateway webhooks: renewals, refunds and disputes
+    'donate.payments.tasks.process_webhook': QUEUE_HIGH,
+    'donate.payments.tasks.process_stripe_webhook': QUEUE_HIGH,
+    # Donation messages for basket, and the donation receipt sent along with them
+    'donate.payments.tasks.send_transaction_to_basket': QUEUE_HIGH,
+    'donate.payments.sqs.relay_outbox': QUEUE_HIGH,
+    'donate.payments.sqs.send_batch_to_sqs': QUEUE_HIGH,
+    # Donation receipts
+    'donate.utility.acoustic.acoustic.flush_pending_mail': QUEUE_HIGH,
+    'donate.utility.acoustic.acoustic.retry_send_mail': QUEUE_HIGH,
+    'donate.utility.acoustic.acoustic.retry_send_mail_batch': QUEUE_HIGH,
+    # Braintree customer records, which nothing waits on
+    'donate.payments.tasks.set_customer_custom_fields': QUEUE_NORMAL,
+    'donate.payments.tasks.send_newsletter_subscription_to_basket': QUEUE_LOW,
+}
+
+
+def get_queue_name(func):
+    return TASK_ROUTES.get(f'{func.__module__}.{func.__qualname__}', QUEUE_NORMAL)
+
+
+def get_queue_for(func):
+    return django_rq.get_queue(get_queue_name(func))
+
+
+def enqueue(func, *args, **kwargs):
+    return get_queue_for(func).enqueue(func, *args, **kwargs)
+
+
+def enqueue_in(delay, func, *args, **kwargs):
+    """
+    Schedule func to be queued after delay (a timedelta). Needs a worker started with --with-scheduler.
+    """
+    return get_queue_for(func).enqueue_in(delay, func, *args, **kwargs)
+
+
+def get_queue_stats():
+    """
+    Return {queue name: stats} for each priority queue. 'depth' is the number of jobs
+    waiting and 'latency' is how long the oldest of them has waited, in seconds.
+    """
+    stats = {}
+    for name in QUEUE_NAMES:
+        queue = django_rq.get_queue(name)
+        oldest_jobs = queue.get_jobs(0, 1)
+        latency = 0
+        if oldest_jobs and oldest_jobs[0].enqueued_at:
+            # RQ stores timestamps as naive UTC datetimes
+            latency = (datetime.utcnow() - oldest_jobs[0].enqueued_at).total_seconds()
+
+        stats[name] = {
+            'depth': queue.count,
+            'latency': latency,
+            'scheduled': queue.scheduled_job_registry.count,
+            'failed': queue.failed_job_registry.count,
+        }
+    return stats
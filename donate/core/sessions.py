@@ -0,0 +1,56 @@
+import json
+import logging
+
+from django.contrib.sessions.backends.cache import SessionStore as CacheSessionStore
+from django_redis.exceptions import ConnectionInterrupted
+from django_redis.serializers.json import JSONSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class CompactJSONSerializer(JSONSerializer):
+    """
+    JSON without the whitespace after separators. Queued GA events are most of a
+    checkout session, and each one is a list of short keys and values.
+    """
+
+    def dumps(self, value):
+        return json.dumps(value, cls=self.encoder_class, separators=(',', ':')).encode()
+
+
+class SessionStore(CacheSessionStore):
+    """
+    Cache session engine that carries on without the session while Redis is down.
+
+    A session that can't be loaded is treated as empty, and one that can't be saved is
+    dropped, so checkout pages keep working but lose their queued events and transaction
+    details. Both are logged. Nothing is written to the database. Deleting a session still
+    fails loudly, so logging out never silently leaves the old session valid.
+    """
+
+    def load(self):
+        try:
+            session_data = self._cache.get(self.cache_key)
+        except ConnectionInterrupted:
+            logger.warning('Could not load session, Redis is unavailable', exc_info=True)
+            session_data = None
+        except Exception:
+            # As Django's cache engine does, reset sessions that can't be read
+            session_data = None
+        if session_data is not None:
+            return session_data
+        self._session_key = None
+        return {}
+
+    def exists(self, session_key):
+        try:
+            return super().exists(session_key)
+        except ConnectionInterrupted:
+            # Let a new session key be picked, it won't be saved anyway
+            return False
+
+    def save(self, must_create=False):
+        try:
+            super().save(must_create=must_create)
+        except ConnectionInterrupted:
+            logger.error('Could not save session, Redis is unavailable', exc_info=True)
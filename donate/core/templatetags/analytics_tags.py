@@ -3,11 +3,26 @@ from django import template
 register = template.Library()
 
 
+def has_session(request):
+    """
+    Whether the request has a session that could hold queued events: either the visitor
+    sent a session cookie, or the view stored something in a new session. Checking this
+    doesn't load the session. Reading the session doesn't count, since the auth and OIDC
+    middleware read it on every request.
+    """
+    session = getattr(request, 'session', None)
+    return session is not None and (session.session_key is not None or session.modified)
+
+
 @register.inclusion_tag('fragments/ga_events.html', takes_context=True)
 # This tag is used to render GA or datalayer event data on the frontend,
 # so it can be picked up by JS.
 def render_ga_event_data(context):
+    request = context['request']
+    if not has_session(request):
+        return {'events': [], 'datalayer_event': {}}
+
     return {
-        'events': context['request'].session.pop('ga_events', []),
-        'datalayer_event': context['request'].session.pop('datalayer_event', {})
+        'events': request.session.pop('ga_events', []),
+        'datalayer_event': request.session.pop('datalayer_event', {})
     }
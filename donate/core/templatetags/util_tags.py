@@ -1,40 +1,83 @@
-import locale
+import functools
+import logging
 import unicodedata
 from decimal import Decimal
 
 from django import template
 from django.conf import settings
-from django.utils.translation import get_language_info, to_locale
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.html import json_script
+from django.utils.translation import get_language, get_language_info, to_locale
 
 from babel.core import Locale
-from babel.numbers import (
-    format_currency as babel_format_currency,
-    get_currency_symbol
-)
+from babel.numbers import get_currency_symbol, parse_pattern
 
 from ..constants import LOCALE_MAP
 
+logger = logging.getLogger(__name__)
+
 register = template.Library()
 
+# Where compile_js_catalogs writes the JavaScript translation catalogs, under the static files
+JS_CATALOG_DIR = '_js/jsi18n'
+
 
 def to_known_locale(code):
     code = LOCALE_MAP.get(code, code)
     return to_locale(code)
 
 
-# Generates a sorted list of currently supported locales. For each locale, the list
+# Generates a sorted tuple of currently supported locales. For each locale, the tuple
 # contains the locale code and the local name of the locale.
 # To sort the list by local names, we use:
 # - Case folding, in order to do case-insensitive comparison, and more.
 # - String normalization using the Normalization Form Canonical Decomposition, to compare
 #   canonical equivalence (e.g. without diacritics)
+# Plain string comparison orders by code point, as collating in the C.UTF-8 locale does,
+# without changing the process-wide locale. Web processes compute the result at startup, see donate.core.warmup.
+@functools.lru_cache(maxsize=None)
+def build_local_language_names():
+    languages = [(lang[0], get_language_info(lang[0])['name_local']) for lang in settings.LANGUAGES]
+    return tuple(sorted(languages, key=lambda x: unicodedata.normalize('NFD', x[1]).casefold()))
+
+
 @register.simple_tag()
 def get_local_language_names():
-    locale.setlocale(locale.LC_ALL, "C.UTF-8")
-    languages = []
-    for lang in settings.LANGUAGES:
-        languages.append([lang[0], get_language_info(lang[0])['name_local']])
-    return sorted(languages, key=lambda x: locale.strxfrm(unicodedata.normalize('NFD', x[1])).casefold())
+    return build_local_language_names()
+
+
+@functools.lru_cache(maxsize=None)
+def get_javascript_catalog_url(language_code):
+    """
+    Return the versioned static URL of the precompiled catalog for this language, or the URL
+    of the JavaScriptCatalog view if compile_js_catalogs hasn't been run.
+    """
+    path = f'{JS_CATALOG_DIR}/{language_code}.js'
+    if finders.find(path):
+        try:
+            return static(path)
+        except ValueError:
+            # The catalog was written after collectstatic ran, so it has no hashed name
+            pass
+    return reverse('javascript-catalog')
+
+
+@register.simple_tag()
+def javascript_catalog_url():
+    return get_javascript_catalog_url(get_language())
+
+
+@functools.lru_cache(maxsize=None)
+def get_braintree_params_json_script():
+    return json_script(settings.BRAINTREE_PARAMS, 'payments__braintree-params')
+
+
+@register.simple_tag()
+def braintree_params_json_script():
+    # The Braintree parameters only change with the settings, so they're encoded once per process
+    return get_braintree_params_json_script()
 
 
 @register.simple_tag(takes_context=True)
@@ -42,10 +85,13 @@ def get_locale(context):
     return to_known_locale(context['request'].LANGUAGE_CODE)
 
 
-@register.simple_tag()
-def format_currency(language_code, currency_code, amount):
-    locale = to_known_locale(language_code)
-    locale_obj = Locale.parse(locale)
+@functools.lru_cache(maxsize=None)
+def get_currency_patterns(language_code):
+    """
+    Return the Locale for a language, with its standard currency pattern parsed twice:
+    once for whole amounts and once for amounts with decimals.
+    """
+    locale_obj = Locale.parse(to_known_locale(language_code))
     pattern = locale_obj.currency_formats['standard'].pattern
 
     # By default, Babel will display a fixed number of decimal places based on the
@@ -55,12 +101,36 @@ def format_currency(language_code, currency_code, amount):
     # In order to work around this, we fetch the pattern for the currency in
     # the current locale, and replace a padded decimal with an optional one.
     # We also have to set currency_digits=False otherwise this gets ignored entirely.
-    if Decimal(amount) == int(float(amount)):
-        pattern = pattern.replace('0.00', '0.##')
+    return locale_obj, parse_pattern(pattern.replace('0.00', '0.##')), parse_pattern(pattern)
+
+
+@functools.lru_cache(maxsize=None)
+def get_currency_formatter(language_code, currency_code):
+    """
+    Return a function that formats an amount of currency_code for language_code.
+    """
+    locale_obj, integer_pattern, decimal_pattern = get_currency_patterns(language_code)
+    currency = currency_code.upper()
+
+    def format_amount(amount):
+        pattern = integer_pattern if Decimal(amount) == int(float(amount)) else decimal_pattern
+        return pattern.apply(amount, locale_obj, currency=currency, currency_digits=False)
 
-    return babel_format_currency(
-        amount, currency_code.upper(), format=pattern, locale=locale_obj, currency_digits=False
-    )
+    return format_amount
+
+
+def warm_currency_formatters():
+    for language_code, _ in settings.LANGUAGES:
+        try:
+            for currency_code in settings.CURRENCIES:
+                get_currency_formatter(language_code, currency_code)
+        except Exception:
+            logger.exception(f'Could not build currency formatters for {language_code}')
+
+
+@register.simple_tag()
+def format_currency(language_code, currency_code, amount):
+    return get_currency_formatter(language_code, currency_code)(amount)
 
 
 @register.simple_tag(takes_context=True)
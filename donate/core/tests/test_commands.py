@@ -0,0 +1,24 @@
+from io import StringIO
+import os
+from tempfile import TemporaryDirectory
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..templatetags.util_tags import JS_CATALOG_DIR
+
+
+class CompileJSCatalogsTestCase(TestCase):
+
+    def test_catalogs_use_each_language_formats(self):
+        with TemporaryDirectory() as static_dir:
+            with override_settings(STATICFILES_DIRS=[static_dir], LANGUAGES=[('en-US', 'English'), ('fr', 'French')]):
+                call_command('compile_js_catalogs', stdout=StringIO())
+
+            with open(os.path.join(static_dir, JS_CATALOG_DIR, 'en-US.js')) as f:
+                en_catalog = f.read()
+            with open(os.path.join(static_dir, JS_CATALOG_DIR, 'fr.js')) as f:
+                fr_catalog = f.read()
+
+        self.assertIn('"DATE_FORMAT": "N j, Y"', en_catalog)
+        self.assertIn('"DATE_FORMAT": "j F Y"', fr_catalog)
@@ -0,0 +1,27 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from ..db import check_persistent_connections
+
+
+class CheckPersistentConnectionsTestCase(TestCase):
+
+    def test_unusable_connection_is_closed(self):
+        connection = mock.Mock()
+        connection.is_usable.return_value = False
+        with mock.patch('donate.core.db.connections') as mock_connections:
+            mock_connections.all.return_value = [connection]
+            check_persistent_connections()
+        connection.close.assert_called_once()
+
+    def test_usable_and_closed_connections_are_left_alone(self):
+        usable = mock.Mock()
+        usable.is_usable.return_value = True
+        closed = mock.Mock(connection=None)
+        with mock.patch('donate.core.db.connections') as mock_connections:
+            mock_connections.all.return_value = [usable, closed]
+            check_persistent_connections()
+        usable.close.assert_not_called()
+        closed.is_usable.assert_not_called()
+        closed.close.assert_not_called()
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from donate.utility.middleware import MiddlewareChain, MiddlewareProfileMiddleware
+
+
+class AddHeaderMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        response['X-Profile'] = 'full'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.full_profile_view = True
+
+
+@override_settings(
+    FULL_MIDDLEWARE=['donate.core.tests.test_middleware.AddHeaderMiddleware'],
+    LEAN_MIDDLEWARE=[],
+    LEAN_MIDDLEWARE_PATHS=['/lean/'],
+)
+class MiddlewareProfileMiddlewareTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.get_response = mock.Mock(return_value={})
+        self.middleware = MiddlewareProfileMiddleware(self.get_response)
+
+    def test_full_profile(self):
+        request = RequestFactory().get('/en-US/')
+        self.assertEqual(self.middleware(request), {'X-Profile': 'full'})
+        self.middleware.process_view(request, None, (), {})
+        self.assertTrue(request.full_profile_view)
+
+    def test_lean_profile(self):
+        request = RequestFactory().get('/lean/')
+        self.assertEqual(self.middleware(request), {})
+        self.middleware.process_view(request, None, (), {})
+        self.assertFalse(hasattr(request, 'full_profile_view'))
+
+    def test_chain_collects_hooks(self):
+        chain = MiddlewareChain(['donate.core.tests.test_middleware.AddHeaderMiddleware'], self.get_response)
+        self.assertEqual(len(chain.view_middleware), 1)
+        self.assertEqual(chain.exception_middleware, [])
+
+
+class MiddlewareSettingsTestCase(SimpleTestCase):
+
+    def test_full_profile_has_middleware_of_silenced_checks(self):
+        for middleware in [
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+            'django.contrib.messages.middleware.MessageMiddleware',
+            'django.middleware.clickjacking.XFrameOptionsMiddleware',
+            'django.middleware.csrf.CsrfViewMiddleware',
+        ]:
+            self.assertIn(middleware, settings.FULL_MIDDLEWARE)
+
+
+class LeanMiddlewareTestCase(TestCase):
+
+    def test_environment_json_skips_full_profile(self):
+        response = self.client.get('/environment.json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Security-Policy', response)
+        self.assertNotIn('Content-Language', response)
+        self.assertNotIn('Set-Cookie', response)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
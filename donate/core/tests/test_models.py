@@ -1,16 +1,19 @@
 from decimal import Decimal
 import json
 from io import StringIO
+from unittest import mock
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.management import call_command
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils.html import json_script
 
 from wagtail.core.models import Page
 
 from donate.payments import constants
 from ..factory.core_pages import CampaignPageFactory, LandingPageFactory
-from ..models import CampaignPageDonationAmount, DonationPage
+from ..models import CampaignPage, CampaignPageDonationAmount, DonationPage
 
 
 class DonationPageTestCase(TestCase):
@@ -152,6 +155,42 @@ class CampaignPageTestCase(TestCase):
             'monthly': [15, 12],
         })
 
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_currencies_are_cached_per_live_revision(self):
+        cache.clear()
+        self.campaign_page.save_revision().publish()
+        default_single = [10, 20, 30, 60]
+        self.assertEqual(
+            CampaignPage.objects.get(pk=self.campaign_page.pk).currencies['usd']['presets']['single'],
+            default_single
+        )
+
+        CampaignPageDonationAmount.objects.create(
+            campaign=self.campaign_page,
+            currency='usd',
+            single_options=json.dumps([{'type': 'amount', 'value': '5'}]),
+            monthly_options=json.dumps([{'type': 'amount', 'value': '15'}]),
+        )
+        page = CampaignPage.objects.get(pk=self.campaign_page.pk)
+        # The override isn't published yet, so the cached table is still used
+        self.assertEqual(page.currencies['usd']['presets']['single'], default_single)
+
+        page.save_revision().publish()
+        self.assertEqual(
+            CampaignPage.objects.get(pk=self.campaign_page.pk).currencies['usd']['presets']['single'],
+            [5]
+        )
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_currencies_json_script_matches_currencies(self):
+        cache.clear()
+        self.campaign_page.save_revision().publish()
+        page = CampaignPage.objects.get(pk=self.campaign_page.pk)
+        self.assertEqual(page.currencies_json_script, json_script(page.currencies, 'currencies'))
+        with mock.patch('donate.core.models.json_script') as mock_json_script:
+            CampaignPage.objects.get(pk=self.campaign_page.pk).currencies_json_script
+        mock_json_script.assert_not_called()
+
     def test_initial_currency_context_includes_overrides(self):
         CampaignPageDonationAmount.objects.create(
             campaign=self.campaign_page,
@@ -197,6 +236,12 @@ class CampaignPageTestCase(TestCase):
             [Decimal(10), Decimal(12), Decimal(15), Decimal(18)]
         )
 
+    def test_get_initial_currency_info_does_not_change_page_currencies(self):
+        page = DonationPage()
+        request = RequestFactory().get('/?presets=10,12,15,18')
+        page.get_initial_currency_info(request, 'usd', 'single')
+        self.assertEqual(page.currencies['usd']['presets']['single'], [10, 20, 30, 60])
+
     def test_get_initial_currency_info_reverse_sorted(self):
         request = RequestFactory().get('/?presets=10,12,15,18&sort=reverse')
         self.assertEqual(
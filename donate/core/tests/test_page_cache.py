@@ -0,0 +1,115 @@
+import gzip
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from wagtail.core.models import Page
+
+from .. import page_cache
+from ..factory.core_pages import LandingPageFactory
+
+
+@override_settings(
+    PAGE_CACHE_ENABLED=True,
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'},
+    },
+    # CI doesn't run collectstatic, so there's no manifest
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class PageCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.page = LandingPageFactory.create(
+            parent=Page.objects.first(),
+            title='Donate today',
+            slug='landing',
+        )
+
+    def get_request(self, url, nonce='nonce', **extra):
+        # What the middleware would have set up for an anonymous visitor
+        request = RequestFactory().get(url, secure=True, **extra)
+        request.LANGUAGE_CODE = 'en-US'
+        request.csp_nonce = nonce
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        return request
+
+    def serve(self, url='/?currency=usd&utm_source=email', **kwargs):
+        return self.page.serve(self.get_request(url, **kwargs))
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.serve(nonce='first-nonce')
+        request = self.get_request('/?utm_source=other&currency=usd', nonce='second-nonce')
+        second = self.page.serve(request)
+
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        content = second.content.decode()
+        self.assertIn('Donate today</h1>', content)
+        # Each response gets its own CSP nonce
+        self.assertIn('nonce="second-nonce"', content)
+        self.assertNotIn('first-nonce', content)
+        self.assertNotIn(page_cache.NONCE_PLACEHOLDER, content)
+        # The page has no form, so the visitor isn't given a CSRF cookie
+        self.assertNotIn('CSRF_COOKIE_USED', request.META)
+
+    def test_placeholders_are_filled_in(self):
+        content = (
+            f'<script nonce="{page_cache.NONCE_PLACEHOLDER}"></script>'
+            f'<input name="csrfmiddlewaretoken" value="{page_cache.CSRF_TOKEN_PLACEHOLDER}">'
+            f'<input name="landing_url" value="{page_cache.LANDING_URL_PLACEHOLDER}">'
+        ).encode('utf-8')
+        request = self.get_request('/?currency=usd&utm_source=other')
+
+        filled = page_cache.fill_placeholders(content, request).decode()
+
+        self.assertIn('<script nonce="nonce">', filled)
+        self.assertRegex(filled, r'name="csrfmiddlewaretoken" value="[a-zA-Z0-9]{64}"')
+        self.assertTrue(request.META['CSRF_COOKIE_USED'])
+        self.assertIn('value="https://testserver/?currency=usd&amp;utm_source=other"', filled)
+
+    def test_gzip_response_is_built_from_cached_parts(self):
+        uncompressed = self.serve(nonce='first-nonce')
+        request = self.get_request(
+            '/?currency=usd&utm_source=other', nonce='second-nonce', HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        response = self.page.serve(request)
+
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        content = gzip.decompress(response.content).decode()
+        self.assertIn('Donate today</h1>', content)
+        self.assertIn('nonce="second-nonce"', content)
+        self.assertNotIn(page_cache.NONCE_PLACEHOLDER, content)
+        self.assertEqual(content, uncompressed.content.decode().replace('first-nonce', 'second-nonce'))
+
+    def test_whitelisted_params_are_separate_variants(self):
+        self.serve('/?currency=usd')
+        self.assertEqual(self.serve('/?currency=gbp')['X-Page-Cache'], 'miss')
+
+    def test_publishing_purges_cache(self):
+        self.serve()
+        self.page.save_revision().publish()
+        self.assertEqual(self.serve()['X-Page-Cache'], 'miss')
+
+    def test_visitors_with_a_session_are_not_cached(self):
+        request = self.get_request('/')
+        request.COOKIES['sessionid'] = 'abc'
+        response = self.page.serve(request)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_streaming_response_is_rendered_without_placeholders(self):
+        def serve():
+            return StreamingHttpResponse([request.csp_nonce])
+
+        request = self.get_request('/', nonce='real-nonce')
+        response = page_cache.serve_cached(self.page, request, serve)
+
+        self.assertEqual(b''.join(response.streaming_content), b'real-nonce')
+        self.assertFalse(response.has_header('X-Page-Cache'))
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.test import TestCase
+
+from donate.payments.tasks import (
+    process_stripe_webhook, send_newsletter_subscription_to_basket, send_transaction_to_basket,
+    set_customer_custom_fields
+)
+from ..queues import enqueue, enqueue_in, get_queue_name, get_queue_stats
+
+
+class QueuesTestCase(TestCase):
+
+    def test_tasks_are_routed_by_priority(self):
+        self.assertEqual(get_queue_name(process_stripe_webhook), 'high')
+        self.assertEqual(get_queue_name(send_transaction_to_basket), 'high')
+        self.assertEqual(get_queue_name(set_customer_custom_fields), 'normal')
+        self.assertEqual(get_queue_name(send_newsletter_subscription_to_basket), 'low')
+
+    def test_unrouted_tasks_go_on_normal(self):
+        self.assertEqual(get_queue_name(datetime.utcnow), 'normal')
+
+    def test_enqueue_uses_routed_queue(self):
+        with mock.patch('donate.core.queues.django_rq') as mock_rq:
+            enqueue(send_newsletter_subscription_to_basket, {'email': 'test@example.com'})
+            enqueue_in(timedelta(seconds=5), process_stripe_webhook, {})
+
+        self.assertEqual(mock_rq.get_queue.call_args_list, [mock.call('low'), mock.call('high')])
+        mock_rq.get_queue.return_value.enqueue.assert_called_once_with(
+            send_newsletter_subscription_to_basket, {'email': 'test@example.com'}
+        )
+        mock_rq.get_queue.return_value.enqueue_in.assert_called_once_with(
+            timedelta(seconds=5), process_stripe_webhook, {}
+        )
+
+    def test_get_queue_stats(self):
+        mock_queue = mock.Mock(count=3)
+        mock_queue.get_jobs.return_value = [mock.Mock(enqueued_at=datetime.utcnow() - timedelta(seconds=30))]
+        mock_queue.scheduled_job_registry.count = 1
+        mock_queue.failed_job_registry.count = 0
+
+        with mock.patch('donate.core.queues.django_rq') as mock_rq:
+            mock_rq.get_queue.return_value = mock_queue
+            stats = get_queue_stats()
+
+        self.assertEqual(list(stats), ['high', 'normal', 'low'])
+        self.assertEqual(stats['high']['depth'], 3)
+        self.assertAlmostEqual(stats['high']['latency'], 30, delta=5)
@@ -0,0 +1,60 @@
+from importlib import import_module
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase
+from django_redis.exceptions import ConnectionInterrupted
+
+from ..sessions import CompactJSONSerializer
+
+
+class SessionTestCase(TestCase):
+
+    def setUp(self):
+        self.SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+
+    def test_session_is_only_stored_in_cache(self):
+        session = self.SessionStore()
+        session['completed_transaction_details'] = {'amount': '10'}
+        with self.assertNumQueries(0):
+            session.save()
+            self.assertEqual(self.SessionStore(session.session_key)['completed_transaction_details'], {'amount': '10'})
+
+    def test_session_expires_with_cookie(self):
+        session = self.SessionStore()
+        session['ga_events'] = [['ecommerce:send']]
+        with mock.patch.object(session._cache, 'add', wraps=session._cache.add) as mock_add:
+            session.save()
+        self.assertEqual(mock_add.call_args[0][2], settings.SESSION_COOKIE_AGE)
+
+    def test_redis_outage_loads_empty_session(self):
+        session = self.SessionStore('a' * 32)
+        with mock.patch.object(session._cache, 'get', side_effect=ConnectionInterrupted(None)):
+            with self.assertLogs('donate.core.sessions', 'WARNING'):
+                self.assertNotIn('ga_events', session)
+        self.assertIsNone(session.session_key)
+
+    def test_redis_outage_drops_session_changes(self):
+        session = self.SessionStore()
+        session['ga_events'] = [['ecommerce:send']]
+        cache = session._cache
+        with mock.patch.object(cache, 'add', side_effect=ConnectionInterrupted(None)), \
+                mock.patch.object(cache, 'has_key', side_effect=ConnectionInterrupted(None)):
+            with self.assertLogs('donate.core.sessions', 'ERROR'), self.assertNumQueries(0):
+                session.save()
+        self.assertIsNotNone(session.session_key)
+        self.assertIsNone(cache.get(session.cache_key))
+
+
+class CompactJSONSerializerTestCase(TestCase):
+
+    def test_dumps_without_whitespace(self):
+        serializer = CompactJSONSerializer({})
+        events = [['send', 'event', {'eventCategory': 'Signup', 'eventAction': 'Submitted the Form'}]]
+        data = serializer.dumps({'ga_events': events})
+        self.assertEqual(
+            data, b'{"ga_events":[["send","event",{"eventCategory":"Signup","eventAction":"Submitted the Form"}]]}'
+        )
+        self.assertEqual(serializer.loads(data), {'ga_events': events})
@@ -1,6 +1,15 @@
-from django.test import TestCase, RequestFactory
+from importlib import import_module
+from unittest import mock
 
-from ..templatetags.util_tags import format_currency, get_localized_currency_symbol, to_known_locale
+from django.conf import settings
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import translation
+
+from ..templatetags.analytics_tags import has_session, render_ga_event_data
+from ..templatetags.util_tags import (
+    format_currency, get_currency_formatter, get_javascript_catalog_url, get_local_language_names,
+    get_localized_currency_symbol, to_known_locale
+)
 
 
 class UtilTagsTestCase(TestCase):
@@ -22,6 +31,31 @@ class UtilTagsTestCase(TestCase):
         value = format_currency('en-US', 'usd', 1.5)
         self.assertEqual(value, '$1.50')
 
+    def test_javascript_catalog_url(self):
+        with mock.patch('donate.core.templatetags.util_tags.finders.find', return_value='/app/fr.js'):
+            with mock.patch('donate.core.templatetags.util_tags.static', return_value='/static/fr.123abc.js'):
+                self.assertEqual(get_javascript_catalog_url.__wrapped__('fr'), '/static/fr.123abc.js')
+
+    def test_javascript_catalog_url_falls_back_to_view(self):
+        with mock.patch('donate.core.templatetags.util_tags.finders.find', return_value=None):
+            with translation.override('fr'):
+                self.assertEqual(get_javascript_catalog_url.__wrapped__('fr'), '/fr/jsi18n/')
+
+    def test_get_local_language_names(self):
+        languages = get_local_language_names()
+        self.assertIsInstance(languages, tuple)
+        self.assertIs(get_local_language_names(), languages)
+        # es and es-MX use the names from the LANG_INFO overrides in settings
+        spain, mexico, french = ('es', 'español (de España)'), ('es-MX', 'español (de Mexico)'), ('fr', 'français')
+        self.assertLess(languages.index(spain), languages.index(mexico))
+        self.assertLess(languages.index(mexico), languages.index(french))
+        self.assertEqual(len(languages), len(settings.LANGUAGES))
+
+    def test_format_currency_reuses_formatter(self):
+        self.assertIs(get_currency_formatter('en-US', 'usd'), get_currency_formatter('en-US', 'usd'))
+        self.assertEqual(format_currency('en-US', 'usd', 2), '$2')
+        self.assertEqual(format_currency('en-US', 'usd', 2.5), '$2.50')
+
     def test_format_currency_usd_en_gb(self):
         value = format_currency('en-GB', 'usd', 1)
         self.assertEqual(value, 'US$1')
@@ -49,3 +83,44 @@ class UtilTagsTestCase(TestCase):
         }
         value = get_localized_currency_symbol(ctx, 'usd')
         self.assertEqual(value, 'US$')
+
+
+# Pages are rendered without a static files manifest
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AnalyticsTagsTestCase(TestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+        self.request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+
+    def test_visitor_without_session_cookie_has_no_session(self):
+        response = self.client.get('/en-US/403/', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        request = response.wsgi_request
+        # The middleware reads the session on every request, but that doesn't give the visitor one
+        self.assertTrue(request.session.accessed)
+        self.assertFalse(has_session(request))
+        self.assertNotContains(response, 'id="ga-events"')
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_visitor_with_session_cookie_gets_queued_events(self):
+        session = self.client.session
+        session['ga_events'] = [['send', 'event', 'foo']]
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+        response = self.client.get('/en-US/403/', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(has_session(response.wsgi_request))
+        self.assertContains(response, 'id="ga-events"')
+        self.assertNotIn('ga_events', response.wsgi_request.session)
+
+    def test_render_ga_event_data_pops_queued_events(self):
+        self.request.session['ga_events'] = [['send', 'event', 'foo']]
+        self.assertEqual(
+            render_ga_event_data({'request': self.request}),
+            {'events': [['send', 'event', 'foo']], 'datalayer_event': {}}
+        )
+        self.assertNotIn('ga_events', self.request.session)
@@ -3,11 +3,15 @@ from django.utils.translation.trans_real import (
     to_language as django_to_language,
     parse_accept_lang_header as django_parse_accept_lang_header
 )
-from django.test import RequestFactory, TestCase
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 
+from wagtail.core.models import Page
+
 from .. import language_code_to_iso_3166, parse_accept_lang_header, to_language
-from ..utils import queue_ga_event, queue_datalayer_event
+from ..factory.core_pages import LandingPageFactory
+from ..utils import get_donation_page_info, is_donation_page, queue_ga_event, queue_datalayer_event
 
 
 class UtilsTestCase(TestCase):
@@ -59,6 +63,37 @@ class UtilsTestCase(TestCase):
         self.assertTrue(request.session.modified)
 
 
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DonationPageIndexTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.page = LandingPageFactory.create(
+            parent=Page.objects.first(),
+            title='Donate today',
+            slug='landing',
+            campaign_id='spring',
+        )
+
+    def test_info_is_cached(self):
+        with self.assertNumQueries(2):
+            info = get_donation_page_info(self.page.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_donation_page_info(self.page.pk), info)
+        self.assertEqual(info, {'project': 'mozillafoundation', 'campaign_id': 'spring'})
+
+    def test_other_pages_are_cached(self):
+        root_page_id = Page.objects.first().pk
+        self.assertFalse(is_donation_page(root_page_id))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_donation_page(root_page_id))
+
+    def test_unpublishing_invalidates_info(self):
+        self.assertTrue(is_donation_page(self.page.pk))
+        self.page.unpublish()
+        self.assertFalse(is_donation_page(self.page.pk))
+
+
 class UtilsIntegrationTestCase(TestCase):
 
     """
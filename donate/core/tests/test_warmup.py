@@ -0,0 +1,32 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import warmup
+from ..templatetags import util_tags
+
+
+class WarmupTestCase(SimpleTestCase):
+
+    def test_failing_warmer_does_not_stop_the_others(self):
+        failing = mock.Mock(side_effect=ValueError, __name__='failing')
+        working = mock.Mock(__name__='working')
+        with mock.patch.object(warmup, 'WARMERS', (failing, working)):
+            with mock.patch.object(warmup, 'logger') as mock_logger:
+                warmup.warm_caches()
+
+        working.assert_called_once()
+        mock_logger.exception.assert_called_once()
+
+    @override_settings(LANGUAGES=[('xx', 'Unknown'), ('fr', 'French')], CURRENCIES={'usd': {}})
+    def test_bad_locale_does_not_stop_currency_formatters(self):
+        def get_currency_formatter(language_code, currency_code):
+            if language_code == 'xx':
+                raise ValueError(language_code)
+
+        with mock.patch.object(util_tags, 'get_currency_formatter', side_effect=get_currency_formatter) as mock_get:
+            with mock.patch.object(util_tags, 'logger') as mock_logger:
+                util_tags.warm_currency_formatters()
+
+        mock_get.assert_called_with('fr', 'usd')
+        mock_logger.exception.assert_called_once()
@@ -1,14 +1,45 @@
+from django.core.cache import cache
+
 from wagtail.core.models import Page
 
+DONATION_PAGE_INDEX_PREFIX = 'donation_page:index'
+DONATION_PAGE_INDEX_TIMEOUT = 60 * 60 * 24  # seconds
 
-def is_donation_page(page_id):
+
+def get_donation_page_info(page_id):
+    """
+    Return {'project': ..., 'campaign_id': ...} for a live landing or campaign page,
+    or None for any other page ID. Results are cached until the page is published or
+    unpublished, see forget_donation_page.
+    """
+    cache_key = f'{DONATION_PAGE_INDEX_PREFIX}:{page_id}'
+    info = cache.get(cache_key)
+    if info is None:
+        info = build_donation_page_info(page_id)
+        cache.set(cache_key, info, DONATION_PAGE_INDEX_TIMEOUT)
+    # Other pages are cached as an empty dict, so they don't hit the database either
+    return info or None
+
+
+def build_donation_page_info(page_id):
     from .models import CampaignPage, LandingPage   # Avoid circular import
     try:
         page = Page.objects.live().get(pk=page_id).specific
     except Page.DoesNotExist:
-        return False
+        return {}
+
+    if page.__class__ not in [CampaignPage, LandingPage]:
+        return {}
 
-    return page.__class__ in [CampaignPage, LandingPage]
+    return {'project': page.project, 'campaign_id': page.campaign_id}
+
+
+def forget_donation_page(page_id):
+    cache.delete(f'{DONATION_PAGE_INDEX_PREFIX}:{page_id}')
+
+
+def is_donation_page(page_id):
+    return get_donation_page_info(page_id) is not None
 
 
 def queue_ga_event(request, event_data):
@@ -0,0 +1,24 @@
+"""
+Build the per-process caches that requests would otherwise build on first use.
+
+Only wsgi.py calls warm_caches(), so management commands and RQ workers don't pay for
+it at startup: they build the entries they need when they first use them.
+"""
+import logging
+
+from donate.views import get_env_variables_content
+
+from .templatetags.util_tags import build_local_language_names, warm_currency_formatters
+
+logger = logging.getLogger(__name__)
+
+WARMERS = (build_local_language_names, get_env_variables_content, warm_currency_formatters)
+
+
+def warm_caches():
+    # A cache that can't be built here is built (or fails) on the request that needs it
+    for warm in WARMERS:
+        try:
+            warm()
+        except Exception:
+            logger.exception(f'Could not warm {warm.__name__}')
@@ -7,6 +7,7 @@ gateway = braintree.BraintreeGateway(
         braintree.Environment.Sandbox if settings.BRAINTREE_USE_SANDBOX else braintree.Environment.Production,
         merchant_id=settings.BRAINTREE_MERCHANT_ID,
         public_key=settings.BRAINTREE_PUBLIC_KEY,
-        private_key=settings.BRAINTREE_PRIVATE_KEY
+        private_key=settings.BRAINTREE_PRIVATE_KEY,
+        timeout=settings.BRAINTREE_TIMEOUT,
     )
 )
@@ -1,24 +1,54 @@
 from django import forms
+from django.db import transaction
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import FormView
 
-from .tasks import queue, process_webhook
+from braintree.exceptions import InvalidSignatureError
+
+from donate.core.queues import enqueue
+
+from . import gateway
+from .tasks import process_webhook
+from .webhook_dedupe import forget_event, is_new_event, payload_fingerprint
 
 
 class WebhookForm(forms.Form):
     bt_signature = forms.CharField()
     bt_payload = forms.CharField()
 
+    def clean(self):
+        cleaned_data = super().clean()
+        # Check the signature before the payload goes into the dedupe index, so that a
+        # forged notification can't suppress the genuine one. Parsing is local, there's
+        # no request to Braintree.
+        if not self.errors:
+            try:
+                gateway.webhook_notification.parse(cleaned_data['bt_signature'], cleaned_data['bt_payload'])
+            except InvalidSignatureError:
+                raise forms.ValidationError('Invalid signature')
+        return cleaned_data
+
 
 @method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
 class BraintreeWebhookView(FormView):
     form_class = WebhookForm
     http_method_names = ['post']
 
     def form_valid(self, form):
-        queue.enqueue(process_webhook, form.cleaned_data, description="Handle Braintree webhook")
+        # Braintree redelivers notifications, only queue the first delivery
+        event_id = payload_fingerprint(form.cleaned_data['bt_payload'])
+        if not is_new_event('braintree', event_id):
+            return HttpResponse()
+
+        try:
+            enqueue(process_webhook, form.cleaned_data, description="Handle Braintree webhook")
+        except Exception:
+            forget_event('braintree', event_id)
+            raise
+
         return HttpResponse()
 
     def form_invalid(self, form):
@@ -6,29 +6,14 @@ from django.utils.translation import get_language, pgettext_lazy
 
 from django_countries.fields import CountryField
 
-from donate.core.utils import is_donation_page
+from donate.core.utils import get_donation_page_info
 from donate.core.templatetags.util_tags import format_currency
-from donate.recaptcha.fields import ReCaptchaField
+from donate.recaptcha.fields import ReCaptchaField, ReCaptchaFormMixin
 
 from . import constants
 from . import utils
 
-from ..settings.environment import root
-
-import json
-import logging
-
-logger = logging.getLogger(__name__)
-
-# Loading a JSON list of countries and their respective post code formats if applicable,
-# from the source/js directory.
-try:
-    with open(f'{root}/source/js/components/post-codes-list.json') as post_code_data:
-        COUNTRY_POST_CODES = json.load(post_code_data)
-except Exception as error:
-    logger.exception('ERROR: could not read in post codes list')
-    logger.exception(error)
-    COUNTRY_POST_CODES = None
+from .postal_codes import is_valid_postal_code, requires_postal_code
 
 # Global maximum amount value of 10 million, not currency-specific, intended
 # only to put a sane upper limit on all payments.
@@ -89,13 +74,12 @@ class PostalCodeMixin():
         cleaned_data = super().clean()
         postal_code = cleaned_data.get('post_code', '')
         country = cleaned_data.get('country', '')
-        # If we cannot import post-code data, default to it being required.
-        if COUNTRY_POST_CODES is None:
-            logger.exception('Error: no postal code data available, defaulting to required(postal_code).')
-            self.check_post_code(postal_code)
-        # Checking if the country uses post-code by finding it in JSON data.
-        elif 'postal' in next(country_obj for country_obj in COUNTRY_POST_CODES if country_obj["abbrev"] == country):
+        if requires_postal_code(country):
             self.check_post_code(postal_code)
+            if settings.VALIDATE_POSTAL_CODE_FORMAT and not is_valid_postal_code(country, postal_code):
+                raise forms.ValidationError({
+                    'post_code': _('Enter a valid postal code.')
+                })
 
     def check_post_code(self, postal_code):
         if postal_code == "":
@@ -112,12 +96,13 @@ class StartCardPaymentForm(MinimumCurrencyAmountMixin, forms.Form):
 
     def clean_source_page_id(self):
         id = self.cleaned_data['source_page_id']
-        if not is_donation_page(id):
+        self.source_page_info = get_donation_page_info(id)
+        if self.source_page_info is None:
             raise forms.ValidationError('Invalid source page ID.')
         return id
 
 
-class BraintreePaymentForm(forms.Form):
+class BraintreePaymentForm(ReCaptchaFormMixin, forms.Form):
     braintree_nonce = forms.CharField(widget=forms.HiddenInput)
     amount = forms.DecimalField(
         label=_('Amount'), min_value=0.01, max_value=MAX_AMOUNT_VALUE, decimal_places=2,
@@ -0,0 +1,40 @@
+"""
+Management command that drains the SQS outbox. Can be used on Heroku as a scheduled task,
+or by hand to catch up after an SQS outage.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from donate.payments.models import OutboxMessage
+from donate.payments.sqs import SQS_BATCH_SIZE, relay_outbox
+
+
+class Command(BaseCommand):
+    help = 'Relay pending outbox messages to the basket SQS queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=SQS_BATCH_SIZE,
+            help=f'Messages per SendMessageBatch call (at most {SQS_BATCH_SIZE}).'
+        )
+        parser.add_argument(
+            '--prune-days', type=int, default=14,
+            help='Delete sent messages older than this many days. Use 0 to keep everything.'
+        )
+
+    def handle(self, *args, **options):
+        relayed = relay_outbox(batch_size=options['batch_size'], schedule_retry=False)
+        self.stdout.write(f'Relayed {relayed} message(s)')
+
+        pending = OutboxMessage.objects.filter(status=OutboxMessage.STATUS_PENDING).count()
+        if pending:
+            self.stdout.write(f'{pending} message(s) still pending')
+
+        if options['prune_days']:
+            cutoff = timezone.now() - timedelta(days=options['prune_days'])
+            num_deleted, __ = OutboxMessage.objects.filter(
+                status=OutboxMessage.STATUS_SENT, sent_at__lt=cutoff
+            ).delete()
+            self.stdout.write(f'Deleted {num_deleted} sent message(s)')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from donate.payments.webhook_dedupe import get_dedupe_stats
+
+
+class Command(BaseCommand):
+    help = 'Show how many redelivered webhook events were skipped by the dedupe index.'
+
+    def handle(self, *args, **options):
+        for source, stats in get_dedupe_stats().items():
+            total = stats['hits'] + stats['misses']
+            hit_rate = stats['hits'] / total * 100 if total else 0
+            self.stdout.write(
+                f"{source}: {stats['misses']} queued, {stats['hits']} duplicates skipped ({hit_rate:.1f}%)"
+            )
@@ -0,0 +1,40 @@
+from django.db import models
+
+
+class OutboxMessage(models.Model):
+    """
+    A message waiting to be relayed to the basket SQS queue.
+
+    Rows are written in the same transaction as the work that produced them, so an
+    event is never lost if SQS is unavailable, nor emitted for work that rolled back.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_REJECTED = 'rejected'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_REJECTED, 'Rejected'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['id'],
+                name='payments_outbox_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return f'Outbox message {self.pk} ({self.status})'
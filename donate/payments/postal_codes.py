@@ -0,0 +1,75 @@
+"""
+Postal code rules for each country. Whether a country uses postal codes is read once at
+startup from the same list that the card form's JavaScript uses to show or hide the
+postal code field.
+
+The formats in that list aren't used: many of them are wrong (it has five digits for
+the United Kingdom and Denmark, for example). Formats are only checked for the
+countries in POSTAL_CODE_FORMATS, which have been tested against real postal codes.
+"""
+import json
+import logging
+import re
+
+from ..settings.environment import root
+
+logger = logging.getLogger(__name__)
+
+POST_CODES_LIST_PATH = f'{root}/source/js/components/post-codes-list.json'
+
+# Spaces and hyphens that people commonly leave out are optional
+POSTAL_CODE_FORMATS = {
+    country: re.compile(pattern, re.IGNORECASE)
+    for country, pattern in {
+        'AT': r'\d{4}',
+        'AU': r'\d{4}',
+        'BE': r'\d{4}',
+        'BR': r'\d{5}-?\d{3}',
+        'CA': r'[ABCEGHJ-NPRSTVXY]\d[ABCEGHJ-NPRSTV-Z] ?\d[ABCEGHJ-NPRSTV-Z]\d',
+        'CH': r'\d{4}',
+        'DE': r'\d{5}',
+        'DK': r'\d{4}',
+        'ES': r'\d{5}',
+        'FR': r'\d{5}',
+        'GB': r'GIR ?0AA|[A-Z]{1,2}\d[A-Z\d]? ?\d[A-Z]{2}',
+        'IE': r'(?:[AC-FHKNPRTV-Y]\d{2}|D6W)[ -]?[0-9AC-FHKNPRTV-Y]{4}',
+        'IT': r'\d{5}',
+        'JP': r'\d{3}-?\d{4}',
+        'MX': r'\d{5}',
+        'NL': r'\d{4} ?[A-Z]{2}',
+        'NZ': r'\d{4}',
+        'PL': r'\d{2}-?\d{3}',
+        'SE': r'\d{3} ?\d{2}',
+        'US': r'\d{5}(?:[- ]?\d{4})?',
+    }.items()
+}
+
+
+def load_postal_code_exemptions(path=POST_CODES_LIST_PATH):
+    """
+    Return the set of codes of countries that don't use postal codes.
+    """
+    with open(path) as post_code_data:
+        countries = json.load(post_code_data)
+
+    return frozenset(country['abbrev'] for country in countries if not country.get('postal'))
+
+
+try:
+    POSTAL_CODE_EXEMPT_COUNTRIES = load_postal_code_exemptions()
+except Exception:
+    # Without the list, a postal code is required for every country
+    logger.exception('ERROR: could not read in post codes list')
+    POSTAL_CODE_EXEMPT_COUNTRIES = frozenset()
+
+
+def requires_postal_code(country):
+    # Countries that aren't in the list need a postal code, as they do in the card form's JavaScript
+    return country not in POSTAL_CODE_EXEMPT_COUNTRIES
+
+
+def is_valid_postal_code(country, postal_code):
+    pattern = POSTAL_CODE_FORMATS.get(country)
+    if pattern is None:
+        return True
+    return pattern.fullmatch(postal_code.strip()) is not None
@@ -1,16 +1,35 @@
+from contextlib import contextmanager
+from datetime import timedelta
 from functools import lru_cache
 import json
 import logging
-from time import time, sleep
-import sched
+import random
+from time import perf_counter
 from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
 
 import botocore
 import boto3
 
+from donate.core.queues import enqueue, enqueue_in
+
+from .models import OutboxMessage
+
 logger = logging.getLogger(__name__)
-schedule = sched.scheduler(time, sleep)
+
+# SendMessageBatch accepts at most 10 entries per call
+SQS_BATCH_SIZE = 10
+SQS_SEND_RETRIES = 3
+SQS_BACKOFF_BASE = 2  # seconds
+SQS_BACKOFF_CAP = 30  # seconds
+# All outbox messages share a group on FIFO queues, so basket receives them in order
+SQS_MESSAGE_GROUP_ID = 'donate'
+# Key of the Postgres advisory lock that lets only one relay run at a time
+OUTBOX_RELAY_LOCK_ID = 0x6f7574626f78  # "outbox"
+# After this many failed attempts the relay waits for the next message, or relay_sqs_outbox
+OUTBOX_RELAY_RETRIES = 10
 
 
 @lru_cache(maxsize=1)
@@ -24,40 +43,272 @@ def sqs_client():
         )
 
 
-def attempt_send_to_sqs(client, payload):
-    client.send_message(
-        QueueUrl=settings.BASKET_SQS_QUEUE_URL,
-        MessageBody=json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True),
-    )
+def encode_payload(payload):
+    return json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True)
 
 
-def send_to_sqs(payload):
-    # If BASKET_SQS_QUEUE_URL is not configured, do nothing (djangorq is logging the payload).
-    if settings.BASKET_SQS_QUEUE_URL:
-        client = sqs_client()
+def build_entry(entry_id, body, deduplication_id=None):
+    entry = {'Id': str(entry_id), 'MessageBody': body}
+    if deduplication_id is not None:
+        # Lets basket discard a message it has already seen if the relay sends it twice
+        entry['MessageAttributes'] = {
+            'DeduplicationId': {'DataType': 'String', 'StringValue': deduplication_id},
+        }
+        if settings.BASKET_SQS_QUEUE_URL.endswith('.fifo'):
+            entry['MessageGroupId'] = SQS_MESSAGE_GROUP_ID
+            entry['MessageDeduplicationId'] = deduplication_id
+    return entry
+
+
+def get_retry_delay(attempt):
+    """
+    Exponential backoff with full jitter, so that retries from many workers
+    don't all hit SQS at the same moment.
+    """
+    return random.uniform(0, min(SQS_BACKOFF_CAP, SQS_BACKOFF_BASE * 2 ** attempt))
+
+
+class SQSBatchPublisher:
+    """
+    Buffers payloads and sends them to the basket SQS queue with SendMessageBatch.
+
+    Entries that SQS could not accept are not retried in-process: they are handed
+    back to RQ as a delayed job, so the worker is never put to sleep waiting on SQS.
+    """
+
+    def __init__(self, client=None, batch_size=SQS_BATCH_SIZE, attempt=0):
+        self.client = client
+        self.batch_size = min(batch_size, SQS_BATCH_SIZE)
+        self.attempt = attempt
+        self.buffer = []
+        self.last_flush_latency = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def add(self, payload):
+        self.buffer.append(payload)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def get_client(self):
+        client = self.client or sqs_client()
         if client is None:
             logger.error("Could not connect to SQS Client.")
-            return
+        return client
 
-    send_retries = 3
-    send_data_immediately = 0  # seconds
-    send_data_delay = 10  # seconds
-    schedule_priority = 1
-    call_args = (client, payload)
-
-    for attempt in range(send_retries):
-        if attempt == 0:
-            schedule.enter(send_data_immediately, schedule_priority, attempt_send_to_sqs, call_args)
-        else:
-            schedule.enter(send_data_delay, schedule_priority, attempt_send_to_sqs, call_args)
+    def flush(self):
+        """
+        Send everything in the buffer, and return the list of payloads that
+        could not be delivered.
+        """
+        payloads, self.buffer = self.buffer, []
+        if not payloads:
+            return []
+
+        client = self.get_client()
+        if client is None:
+            return payloads
+
+        started = perf_counter()
+        failed = []
+        for offset in range(0, len(payloads), self.batch_size):
+            batch = payloads[offset:offset + self.batch_size]
+            retry_ids, _ = self.send_entries(client, [
+                build_entry(index, encode_payload(payload)) for index, payload in enumerate(batch)
+            ])
+            failed += [batch[int(entry_id)] for entry_id in retry_ids]
+        self.last_flush_latency = perf_counter() - started
+
+        logger.info(
+            f'Flushed {len(payloads)} message(s) to SQS in {self.last_flush_latency * 1000:.1f}ms '
+            f'({len(failed)} failed)'
+        )
+
+        if failed:
+            self.schedule_retry(failed)
+
+        return failed
+
+    def send_entries(self, client, entries):
+        """
+        Send up to SQS_BATCH_SIZE prepared entries in a single call.
+
+        Returns a tuple of (ids worth retrying, {id: error} for entries SQS rejected outright).
+        """
         try:
-            # explicitly block, just in case the implicit behaviour changes in the future
-            schedule.run(blocking=True)
-            break
+            response = client.send_message_batch(QueueUrl=settings.BASKET_SQS_QUEUE_URL, Entries=entries)
         except botocore.exceptions.ClientError as err:
-            if attempt != 2:
-                logger.error(f"Error when sending data to SQS: {err}")
+            logger.error(f"Error when sending data to SQS: {err}")
+            return [entry['Id'] for entry in entries], {}
+
+        retry_ids = []
+        rejected = {}
+        for failure in response.get('Failed', []):
+            if failure.get('SenderFault'):
+                # The message itself was rejected, retrying would give the same result
+                error = f"{failure.get('Code')}: {failure.get('Message')}"
+                logger.error(f"SQS rejected message: {error}")
+                rejected[failure['Id']] = error
             else:
-                logger.error(f"Could not send data to SQS. Unable to connect after {send_retries} retries.")
+                retry_ids.append(failure['Id'])
+
+        return retry_ids, rejected
+
+    def schedule_retry(self, payloads):
+        next_attempt = self.attempt + 1
+        if next_attempt >= SQS_SEND_RETRIES:
+            logger.error(f"Could not send data to SQS. Unable to connect after {SQS_SEND_RETRIES} retries.")
+            return
+
+        delay = get_retry_delay(next_attempt)
+        enqueue_in(
+            timedelta(seconds=delay),
+            send_batch_to_sqs,
+            payloads,
+            attempt=next_attempt,
+        )
+
+
+def send_batch_to_sqs(payloads, attempt=0):
+    """
+    Send payloads straight to SQS, bypassing the outbox.
+    """
+    # If BASKET_SQS_QUEUE_URL is not configured, do nothing (djangorq is logging the payload).
+    if not settings.BASKET_SQS_QUEUE_URL:
+        return
+
+    with SQSBatchPublisher(attempt=attempt) as publisher:
+        for payload in payloads:
+            publisher.add(payload)
+
+
+def send_to_sqs(payload):
+    """
+    Queue a payload for basket. It is written to the outbox as part of the current
+    transaction, and relayed to SQS once that transaction commits.
+    """
+    # If BASKET_SQS_QUEUE_URL is not configured, do nothing (djangorq is logging the payload).
+    if not settings.BASKET_SQS_QUEUE_URL:
+        return
+
+    OutboxMessage.objects.create(body=encode_payload(payload))
+    transaction.on_commit(lambda: enqueue(relay_outbox))
+
+
+@contextmanager
+def outbox_relay_lock():
+    """
+    Try to take the relay's session-level advisory lock, and yield whether it was taken.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [OUTBOX_RELAY_LOCK_ID])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [OUTBOX_RELAY_LOCK_ID])
+
+
+def relay_pending_messages(publisher, client):
+    """
+    Send pending outbox messages in id order until there are none left, or SQS fails
+    part of a batch. Only call this while holding outbox_relay_lock().
+
+    Returns a tuple of (number of messages relayed, whether a batch failed).
+    """
+    relayed = 0
+    while True:
+        messages = list(
+            OutboxMessage.objects.filter(status=OutboxMessage.STATUS_PENDING).order_by('id')[:publisher.batch_size]
+        )
+        if not messages:
+            return relayed, False
+
+        # No rows are locked while SQS is called. If the relay dies before recording the
+        # result, the batch is sent again and basket drops the duplicates by DeduplicationId.
+        retry_ids, rejected = publisher.send_entries(client, [
+            build_entry(message.pk, message.body, deduplication_id=f'outbox-{message.pk}')
+            for message in messages
+        ])
+
+        sent_at = timezone.now()
+        for message in messages:
+            entry_id = str(message.pk)
+            message.attempts += 1
+            if entry_id in rejected:
+                message.status = OutboxMessage.STATUS_REJECTED
+                message.last_error = rejected[entry_id]
+            elif entry_id not in retry_ids:
+                message.status = OutboxMessage.STATUS_SENT
+                message.sent_at = sent_at
+        OutboxMessage.objects.bulk_update(messages, ['status', 'attempts', 'last_error', 'sent_at'])
+
+        relayed += len(messages) - len(retry_ids) - len(rejected)
+        if retry_ids:
+            return relayed, True
+
+
+def schedule_relay_retry(batch_size, attempt):
+    if attempt + 1 >= OUTBOX_RELAY_RETRIES:
+        logger.error(
+            f'Could not relay the SQS outbox after {OUTBOX_RELAY_RETRIES} attempts. '
+            'Pending messages are sent by the next relay, or by relay_sqs_outbox.'
+        )
+        return
+
+    enqueue_in(
+        timedelta(seconds=get_retry_delay(attempt)),
+        relay_outbox,
+        batch_size=batch_size,
+        attempt=attempt + 1,
+    )
+
+
+def relay_outbox(batch_size=SQS_BATCH_SIZE, attempt=0, schedule_retry=True):
+    """
+    Drain pending outbox messages to SQS in id order, one SendMessageBatch at a time.
+
+    Only one relay runs at a time, so later messages never overtake earlier ones. A
+    relay that finds another one running returns straight away: before the running
+    relay lets go of the lock, it checks for messages that arrived in the meantime.
+    If SQS fails part of a batch the relay stops there and tries again after a
+    jittered backoff, up to OUTBOX_RELAY_RETRIES times.
+
+    Returns the number of messages relayed.
+    """
+    if not settings.BASKET_SQS_QUEUE_URL:
+        return 0
+
+    publisher = SQSBatchPublisher(batch_size=batch_size)
+    client = publisher.get_client()
+    if client is None:
+        return 0
+
+    relayed = 0
+    started = perf_counter()
+    while True:
+        with outbox_relay_lock() as acquired:
+            if not acquired:
+                break
+            sent, failed = relay_pending_messages(publisher, client)
+        relayed += sent
+
+        if failed:
+            if schedule_retry:
+                schedule_relay_retry(batch_size, attempt)
+            break
+
+        # Messages committed while the lock was held may have had their relay turned away
+        if not OutboxMessage.objects.filter(status=OutboxMessage.STATUS_PENDING).exists():
+            break
+
+    if relayed:
+        logger.info(f'Relayed {relayed} outbox message(s) to SQS in {(perf_counter() - started) * 1000:.1f}ms')
 
-            continue
+    return relayed
@@ -1,27 +1,57 @@
 import json
+from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
-from .tasks import queue, process_stripe_webhook
+import stripe
+
+from donate.core.queues import enqueue
+
+from .tasks import process_stripe_webhook
+from .webhook_dedupe import forget_event, is_new_event
 
 
 @method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
 class StripeWebhookView(View):
     http_method_names = ['post']
 
     def post(self, request):
-        signature = request.META['HTTP_STRIPE_SIGNATURE']
+        signature = request.META.get('HTTP_STRIPE_SIGNATURE')
 
         if not signature:
             return HttpResponseBadRequest(reason='HTTP_STRIPE_SIGNATURE must be provided')
 
+        # Check the signature against the body as Stripe sent it, before parsing it,
+        # so that forged requests never reach the queue
+        try:
+            payload = request.body.decode('utf-8')
+            stripe.WebhookSignature.verify_header(
+                payload, signature, settings.STRIPE_WEBHOOK_SECRET, stripe.Webhook.DEFAULT_TOLERANCE
+            )
+        except (UnicodeDecodeError, stripe.error.SignatureVerificationError):
+            return HttpResponseBadRequest(reason='Signature is invalid')
+
         try:
-            payload = json.loads(request.body)
+            event = json.loads(payload)
         except json.JSONDecodeError:
             return HttpResponseBadRequest(reason='Payload is not valid JSON')
 
-        queue.enqueue(process_stripe_webhook, payload, signature=signature)
+        event_id = event.get('id') if isinstance(event, dict) else None
+        if not event_id:
+            return HttpResponseBadRequest(reason='Payload has no event ID')
+
+        # Stripe redelivers events, only queue the first delivery
+        if not is_new_event('stripe', event_id):
+            return HttpResponse()
+
+        try:
+            enqueue(process_stripe_webhook, request.body, event_id)
+        except Exception:
+            forget_event('stripe', event_id)
+            raise
 
         return HttpResponse()
@@ -1,13 +1,16 @@
+import json
 import logging
 import time
 from decimal import Decimal
+from functools import wraps
 
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.timezone import datetime, timedelta
 
-import django_rq
 import requests
 import stripe
+from stripe.stripe_object import StripeObject
 
 from ..utility.acoustic.acoustic import acoustic_tx
 from . import constants, gateway
@@ -20,10 +23,14 @@ from .utils import (
 
 logger = logging.getLogger(__name__)
 
-queue = django_rq.get_queue('default')
-
 BASKET_NEWSLETTER_API_PATH = '/news/subscribe/'
-STRIPE_WEBHOOK_SECRET = settings.STRIPE_WEBHOOK_SECRET
+BRAINTREE_CUSTOMER_CACHE_PREFIX = 'braintree:customer_fields'
+# Longer than a billing cycle, so the next renewal of a subscription is served from cache
+BRAINTREE_CUSTOMER_CACHE_TIMEOUT = 60 * 60 * 24 * 40  # seconds
+# Stripe resources that webhook handlers can prefetch, keyed by the first part of the event type
+STRIPE_PREFETCH_RESOURCES = {
+    'charge': 'Charge',
+}
 stripe.api_key = settings.STRIPE_API_KEY
 
 
@@ -107,6 +114,11 @@ def process_donation_receipt(donation_data):
     lang_key = message_data.get('locale', settings.LANGUAGE_CODE)
     message_id = LANGUAGE_IDS.get(lang_key, settings.DEFAULT_LANGUAGE_ID)
 
+    if settings.ACOUSTIC_TX_BATCH_RECEIPTS:
+        # Receipts are grouped by campaign (one per language) and sent together
+        acoustic_tx.queue_mail(email, message_id, send_data, save_to_db=True)
+        return
+
     acoustic_tx.send_mail(
         email,
         message_id,
@@ -175,6 +187,20 @@ def process_dispute(event):
     })
 
 
+def update_customer(customer_id, payment_method_token, params):
+    """
+    Update a Braintree customer, dropping any cached custom fields for the payment method.
+    """
+    cache.delete(f'{BRAINTREE_CUSTOMER_CACHE_PREFIX}:{payment_method_token}')
+    return gateway.customer.update(customer_id, params)
+
+
+def set_customer_custom_fields(customer_id, payment_method_token, custom_fields):
+    result = update_customer(customer_id, payment_method_token, {'custom_fields': custom_fields})
+    if not result.is_success:
+        logger.error(f'Failed to set custom fields on Braintree customer {customer_id}: {result.message}')
+
+
 class BraintreeWebhookProcessor:
     def process(self, notification):
         kind = notification.kind
@@ -185,13 +211,23 @@ class BraintreeWebhookProcessor:
         elif kind == 'dispute_lost':
             self.dispute_lost(notification)
 
-    def subscription_charged_successfully(self, notification):
-        last_tx = notification.subscription.transactions[0]
-        is_paypal = last_tx.payment_instrument_type == 'paypal_account'
-
-        # Custom fields are stored against the customer, and it requires a few
-        # steps to get this object from Braintree
-        payment_method = gateway.payment_method.find(notification.subscription.payment_method_token)
+    @staticmethod
+    def get_customer_custom_fields(payment_method_token):
+        """
+        Return the custom fields of the customer that owns a payment method, or None
+        if they could not be completed.
+
+        Custom fields are stored against the customer, and it requires two API calls
+        to get this object from Braintree. Subscriptions renew with the same payment
+        method every month, so the fields are cached by payment method token for
+        longer than that.
+        """
+        cache_key = f'{BRAINTREE_CUSTOMER_CACHE_PREFIX}:{payment_method_token}'
+        custom_fields = cache.get(cache_key)
+        if custom_fields is not None:
+            return custom_fields
+
+        payment_method = gateway.payment_method.find(payment_method_token)
         customer = gateway.customer.find(payment_method.customer_id)
 
         custom_fields = customer.custom_fields or {}
@@ -205,7 +241,7 @@ class BraintreeWebhookProcessor:
         if not custom_fields.get('project'):
             custom_fields['project'] = 'mozillafoundation'
 
-            customer_update_result = gateway.customer.update(customer.id, {
+            customer_update_result = update_customer(customer.id, payment_method_token, {
                 'custom_fields': custom_fields
             })
 
@@ -213,7 +249,18 @@ class BraintreeWebhookProcessor:
                 message = f'Failed to update a Braintree customer with a project custom_field: {customer.id}'
                 print(message)
                 logger.error(message, exc_info=True)
-                return
+                return None
+
+        cache.set(cache_key, custom_fields, BRAINTREE_CUSTOMER_CACHE_TIMEOUT)
+        return custom_fields
+
+    def subscription_charged_successfully(self, notification):
+        last_tx = notification.subscription.transactions[0]
+        is_paypal = last_tx.payment_instrument_type == 'paypal_account'
+
+        custom_fields = self.get_customer_custom_fields(notification.subscription.payment_method_token)
+        if custom_fields is None:
+            return
 
         # The details of a donor are in a different spot depending on the payment method
         if is_paypal:
@@ -272,7 +319,47 @@ class BraintreeWebhookProcessor:
         })
 
 
+def is_expanded(stripe_object, path):
+    """
+    Return True if every object along an expand path such as 'invoice.subscription'
+    is already present, so it can be used without another API call. Objects that
+    Stripe has not expanded are plain ID strings. A missing (None) object has
+    nothing to fetch, so it counts as present.
+    """
+    value = stripe_object
+    for attr in path.split('.'):
+        value = getattr(value, attr, None)
+        if value is None:
+            return True
+        if not isinstance(value, StripeObject):
+            return False
+    return True
+
+
+def stripe_prefetch(*expand):
+    """
+    Declare the Stripe objects a webhook handler needs, as expand paths relative to
+    the event's object. The handler is then called with the event and that object,
+    fetched with everything it needs by StripeWebhookProcessor.prefetch.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(self, event):
+            stripe_object = self.prefetch(event, expand)
+            if stripe_object is not None:
+                return handler(self, event, stripe_object)
+
+        wrapper.stripe_expand = expand
+        return wrapper
+
+    return decorator
+
+
 class StripeWebhookProcessor:
+    def __init__(self):
+        # Number of Stripe API requests made for the current event
+        self.api_calls = 0
+
     def process(self, event):
         # Stripe event types use dot-notation, so convert periods to underscores
         event_type = event.type.replace('.', '_')
@@ -284,20 +371,35 @@ class StripeWebhookProcessor:
             return
 
         if process_method is not None:
-            return process_method(event)
-
-    @staticmethod
-    def process_charge_succeeded(event):
-        charge_id = event.data.object.id
+            self.api_calls = 0
+            result = process_method(event)
+            logger.info(f'Processed Stripe {event.type} event {event.id} with {self.api_calls} API call(s)')
+            return result
+
+    def call_stripe(self, method, *args, **kwargs):
+        self.api_calls += 1
+        return method(*args, **kwargs)
+
+    def prefetch(self, event, expand):
+        """
+        Return the event's object with every path in expand available. The object
+        from the event payload is reused as-is if nothing is missing, otherwise it is
+        retrieved once with all of the missing paths expanded. Returns None if the
+        object could not be fetched.
+        """
+        stripe_object = event.data.object
+        missing = [path for path in expand if not is_expanded(stripe_object, path)]
+        if not missing:
+            return stripe_object
+
+        resource_name = STRIPE_PREFETCH_RESOURCES[event.type.split('.')[0]]
         try:
-            charge = stripe.Charge.retrieve(
-                charge_id,
-                expand=['invoice', 'balance_transaction']
-            )
+            return self.call_stripe(getattr(stripe, resource_name).retrieve, stripe_object.id, expand=missing)
         except stripe.error.StripeError as e:
-            logger.error(f'Error fetching Stripe Charge: {e._message}', exc_info=True)
-            return
+            logger.error(f'Error fetching Stripe {resource_name}: {e._message}', exc_info=True)
 
+    @stripe_prefetch('invoice.subscription.customer', 'balance_transaction')
+    def process_charge_succeeded(self, event, charge):
         if not charge.invoice or not charge.invoice.subscription:
             logger.info('This charge is not associated with a subscription')
             return
@@ -307,14 +409,7 @@ class StripeWebhookProcessor:
         net_amount = balance_transaction.net / 100
         transaction_fee = balance_transaction.fee / 100
 
-        subscription_id = charge.invoice.subscription
-
-        try:
-            subscription = stripe.Subscription.retrieve(subscription_id, expand=['customer'])
-        except stripe.error.StripeError as e:
-            logger.error(f'Error fetching Stripe Subscription: {e._message}', exc_info=True)
-            return
-
+        subscription = charge.invoice.subscription
         metadata = subscription.metadata
         donation_url = None
 
@@ -329,7 +424,7 @@ class StripeWebhookProcessor:
             description = 'Mozilla Foundation Monthly Donation'
 
         try:
-            stripe.Charge.modify(charge_id, metadata=metadata, description=description)
+            self.call_stripe(stripe.Charge.modify, charge.id, metadata=metadata, description=description)
         except stripe.error.StripeError as e:
             logger.error(f'Error updating Stripe Charge description and metadata: {e._message}', exc_info=True)
             return
@@ -370,27 +465,23 @@ class StripeWebhookProcessor:
         if settings.MIGRATE_STRIPE_SUBSCRIPTIONS_ENABLED and 'thunderbird' not in metadata:
             MigrateStripeSubscription().process(charge, subscription)
 
-    @staticmethod
-    def process_charge_dispute_closed(event):
+    def process_charge_dispute_closed(self, event):
         process_dispute(event)
 
-    @staticmethod
-    def process_charge_dispute_created(event):
+    def process_charge_dispute_created(self, event):
         dispute = event.data.object
         if settings.AUTO_CLOSE_STRIPE_DISPUTES and dispute.status != 'lost':
             try:
-                stripe.Dispute.close(dispute.id)
+                self.call_stripe(stripe.Dispute.close, dispute.id)
             except stripe.error.StripeError as e:
                 logger.error(f'Error closing dispute {dispute.id}: {e._message}', exc_info=True)
 
         process_dispute(event)
 
-    @staticmethod
-    def process_charge_dispute_updated(event):
+    def process_charge_dispute_updated(self, event):
         process_dispute(event)
 
-    @staticmethod
-    def process_charge_refunded(event):
+    def process_charge_refunded(self, event):
         charge = event.data.object
         refund = charge.refunds.data[0]
         reason = refund.reason
@@ -408,21 +499,13 @@ class StripeWebhookProcessor:
             }
         })
 
-    @staticmethod
-    def process_charge_failed(event):
-        charge = event.data.object
-
+    @stripe_prefetch('invoice.subscription.customer')
+    def process_charge_failed(self, event, charge):
         if not charge.invoice:
             logger.info('This charge is not associated with a subscription')
             return
 
-        try:
-            invoice = stripe.Invoice.retrieve(charge.invoice, expand=['subscription.customer'])
-        except stripe.error.StripeError as e:
-            logger.error(f'Error fetching Stripe Invoice: {e._message}', exc_info=True)
-            return
-
-        subscription = invoice.subscription
+        subscription = charge.invoice.subscription
         metadata = subscription.metadata
         failure_code = charge.failure_code
 
@@ -536,18 +619,26 @@ def process_webhook(form_data):
     BraintreeWebhookProcessor().process(notification)
 
 
-def process_stripe_webhook(form_data, signature=None):
+def process_stripe_webhook(payload, event_id=None, signature=None):
+    """
+    Process a Stripe event, given the raw body of its webhook. StripeWebhookView has
+    already checked the payload's signature.
+
+    Releases before the webhook view checked signatures queued the parsed event as a dict,
+    along with the signature. Those jobs are still processed, without a check, as they
+    always were. Remove the dict form and the signature argument once the `high` and
+    `default` queues have no queued, scheduled or failed jobs left from before the release
+    that moved the signature check into the view (see `manage.py rq_queue_stats`).
+    """
     try:
-        event = stripe.Event.construct_from(
-            form_data,
-            signature,
-            STRIPE_WEBHOOK_SECRET
-        )
+        if isinstance(payload, dict):
+            event_id = payload.get('id')
+            data = payload
+        else:
+            data = json.loads(payload)
+        event = stripe.Event.construct_from(data, stripe.api_key)
     except ValueError:
-        logger.error('Request payload invalid', exc_info=True)
-        return
-    except stripe.error.SignatureVerificationError:
-        logger.error('Request signature invalid', exc_info=True)
+        logger.error(f'Stripe event {event_id} payload invalid', exc_info=True)
         return
 
     StripeWebhookProcessor().process(event)
@@ -0,0 +1,55 @@
+import json
+from unittest import mock
+
+from django.test import TestCase
+
+from silverpop.api import SilverpopResponseException
+
+from donate.utility.acoustic.acoustic import MAX_BATCH_RECIPIENTS, acoustic_tx, retry_send_mail_batch
+
+
+def pending_mail(to, campaign_id):
+    return json.dumps({'to': to, 'campaign_id': campaign_id, 'fields': {}, 'save_to_db': True}).encode('utf-8')
+
+
+class FlushPendingMailTestCase(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('donate.utility.acoustic.acoustic.get_redis_connection')
+        self.pipeline = patcher.start().return_value.pipeline.return_value
+        self.addCleanup(patcher.stop)
+
+    def test_takes_one_batch_at_a_time(self):
+        self.pipeline.execute.side_effect = [
+            ([pending_mail('a@example.com', '1'), pending_mail('b@example.com', '2')], True),
+            ([pending_mail('c@example.com', '1')], True),
+            ([], True),
+        ]
+        with mock.patch.object(acoustic_tx, 'send_mail_batch') as mock_send_mail_batch:
+            acoustic_tx.flush_pending_mail()
+
+        self.pipeline.lrange.assert_called_with('acoustic:pending_mail', 0, MAX_BATCH_RECIPIENTS - 1)
+        self.pipeline.ltrim.assert_called_with('acoustic:pending_mail', MAX_BATCH_RECIPIENTS, -1)
+        self.assertEqual(mock_send_mail_batch.call_args_list, [
+            mock.call('1', [('a@example.com', {})], True),
+            mock.call('2', [('b@example.com', {})], True),
+            mock.call('1', [('c@example.com', {})], True),
+        ])
+
+    def test_failed_batch_is_retried_and_the_rest_are_sent(self):
+        self.pipeline.execute.side_effect = [
+            ([pending_mail('a@example.com', '1'), pending_mail('b@example.com', '2')], True),
+            ([], True),
+        ]
+        with mock.patch.object(
+            acoustic_tx, 'send_mail_batch', side_effect=[SilverpopResponseException('Bad request'), {}]
+        ) as mock_send_mail_batch:
+            with mock.patch('donate.utility.acoustic.acoustic.enqueue_in') as mock_enqueue_in:
+                acoustic_tx.flush_pending_mail()
+
+        self.assertEqual(mock_send_mail_batch.call_count, 2)
+        mock_enqueue_in.assert_called_once()
+        self.assertEqual(
+            mock_enqueue_in.call_args[0][1:], (retry_send_mail_batch, '1', [('a@example.com', {})], True)
+        )
+        self.assertEqual(mock_enqueue_in.call_args[1], {'attempt': 1})
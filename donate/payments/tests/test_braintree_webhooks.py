@@ -2,28 +2,72 @@ from unittest import mock
 
 from django.test import TestCase
 
+from braintree.exceptions import InvalidSignatureError
+
 from ..braintree_webhooks import WebhookForm, BraintreeWebhookView
 from ..tasks import process_webhook
 
 
+@mock.patch('donate.payments.braintree_webhooks.is_new_event', return_value=True)
 class BraintreeWebhookViewTestCase(TestCase):
 
-    def test_form_valid_queues_task(self):
+    def setUp(self):
+        patcher = mock.patch('donate.payments.braintree_webhooks.gateway')
+        self.mock_gateway = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_form_valid_queues_task(self, mock_is_new_event):
         form = WebhookForm({
             'bt_signature': 'signature',
             'bt_payload': 'payload'
         })
         assert form.is_valid()
-        with mock.patch('donate.payments.braintree_webhooks.queue') as mock_queue:
+        with mock.patch('donate.payments.braintree_webhooks.enqueue') as mock_enqueue:
             response = BraintreeWebhookView().form_valid(form)
 
-        mock_queue.enqueue.assert_called_once_with(
+        mock_enqueue.assert_called_once_with(
             process_webhook, form.cleaned_data,
             description="Handle Braintree webhook"
         )
         self.assertEqual(response.status_code, 200)
 
-    def test_form_invalid_returns_400(self):
+    def test_view_is_not_atomic(self, mock_is_new_event):
+        self.assertIn('default', BraintreeWebhookView.as_view()._non_atomic_requests)
+
+    def test_duplicate_notification_is_acknowledged_without_queueing(self, mock_is_new_event):
+        mock_is_new_event.return_value = False
+        form = WebhookForm({
+            'bt_signature': 'signature',
+            'bt_payload': 'payload'
+        })
+        assert form.is_valid()
+        with mock.patch('donate.payments.braintree_webhooks.enqueue') as mock_enqueue:
+            response = BraintreeWebhookView().form_valid(form)
+
+        mock_enqueue.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+
+    def test_form_checks_signature(self, mock_is_new_event):
+        form = WebhookForm({
+            'bt_signature': 'signature',
+            'bt_payload': 'payload'
+        })
+        assert form.is_valid()
+        self.mock_gateway.webhook_notification.parse.assert_called_once_with('signature', 'payload')
+
+    def test_forged_notification_is_rejected_before_dedupe(self, mock_is_new_event):
+        self.mock_gateway.webhook_notification.parse.side_effect = InvalidSignatureError
+        with mock.patch('donate.payments.braintree_webhooks.enqueue') as mock_enqueue:
+            response = self.client.post('/braintree/webhook/', {
+                'bt_signature': 'forged',
+                'bt_payload': 'payload'
+            }, secure=True)
+
+        self.assertEqual(response.status_code, 400)
+        mock_is_new_event.assert_not_called()
+        mock_enqueue.assert_not_called()
+
+    def test_form_invalid_returns_400(self, mock_is_new_event):
         form = WebhookForm({})
         response = BraintreeWebhookView().form_invalid(form)
         self.assertEqual(response.status_code, 400)
@@ -1,8 +1,8 @@
 from django import forms
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from .. import constants
-from ..forms import MinimumCurrencyAmountMixin
+from ..forms import MinimumCurrencyAmountMixin, PostalCodeMixin
 
 
 class MinimumCurrencyTestForm(MinimumCurrencyAmountMixin, forms.Form):
@@ -11,6 +11,11 @@ class MinimumCurrencyTestForm(MinimumCurrencyAmountMixin, forms.Form):
     frequency = forms.ChoiceField(choices=constants.FREQUENCY_CHOICES, widget=forms.HiddenInput)
 
 
+class PostalCodeTestForm(PostalCodeMixin, forms.Form):
+    country = forms.CharField()
+    post_code = forms.CharField(required=False)
+
+
 class MinimumCurrencyAmountMixinTestCase(TestCase):
 
     def test_init_sets_min_attr_if_currency_and_frequency_supplied(self):
@@ -26,3 +31,50 @@ class MinimumCurrencyAmountMixinTestCase(TestCase):
         form = MinimumCurrencyTestForm({'amount': 1, 'currency': 'usd', 'frequency': constants.FREQUENCY_MONTHLY})
         self.assertFalse(form.is_valid())
         self.assertEqual(form.errors, {'amount': ['Donations must be $5 or more']})
+
+
+class PostalCodeMixinTestCase(TestCase):
+
+    def test_post_code_required_for_country_with_post_codes(self):
+        form = PostalCodeTestForm({'country': 'US', 'post_code': ''})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors, {'post_code': ['This field is required.']})
+
+    def test_post_code_not_required_for_country_without_post_codes(self):
+        self.assertTrue(PostalCodeTestForm({'country': 'AO', 'post_code': ''}).is_valid())
+
+    def test_post_code_required_for_unknown_country(self):
+        self.assertFalse(PostalCodeTestForm({'country': 'XX', 'post_code': ''}).is_valid())
+
+    def test_post_code_format_not_checked_by_default(self):
+        self.assertTrue(PostalCodeTestForm({'country': 'US', 'post_code': 'abc'}).is_valid())
+
+    @override_settings(VALIDATE_POSTAL_CODE_FORMAT=True)
+    def test_post_code_format_checked_when_enabled(self):
+        form = PostalCodeTestForm({'country': 'US', 'post_code': 'abc'})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors, {'post_code': ['Enter a valid postal code.']})
+        self.assertTrue(PostalCodeTestForm({'country': 'US', 'post_code': '12345-6789'}).is_valid())
+        self.assertTrue(PostalCodeTestForm({'country': 'CA', 'post_code': 'k1a 0b1'}).is_valid())
+
+    @override_settings(VALIDATE_POSTAL_CODE_FORMAT=True)
+    def test_post_code_format_accepts_real_post_codes(self):
+        for country, post_codes in {
+            'GB': ['SW1A 1AA', 'sw1a1aa', 'M1 1AE', 'B33 8TH', 'DN55 1PT', 'EC1A 1BB', 'GIR 0AA'],
+            'JP': ['100-0001', '1000001'],
+            'IE': ['D02 X285', 'A65F4E2', 'D6W 1234'],
+        }.items():
+            for post_code in post_codes:
+                with self.subTest(country=country, post_code=post_code):
+                    self.assertTrue(PostalCodeTestForm({'country': country, 'post_code': post_code}).is_valid())
+
+    @override_settings(VALIDATE_POSTAL_CODE_FORMAT=True)
+    def test_post_code_format_rejects_invalid_post_codes(self):
+        for country, post_code in [('GB', '12345'), ('GB', 'SW1A'), ('JP', '100-00011'), ('IE', 'B02 X285')]:
+            with self.subTest(country=country, post_code=post_code):
+                self.assertFalse(PostalCodeTestForm({'country': country, 'post_code': post_code}).is_valid())
+
+    @override_settings(VALIDATE_POSTAL_CODE_FORMAT=True)
+    def test_post_code_format_not_checked_for_unlisted_country(self):
+        # The shared list has five digits for Guernsey, which uses UK style post codes
+        self.assertTrue(PostalCodeTestForm({'country': 'GG', 'post_code': 'GY1 1AA'}).is_valid())
@@ -0,0 +1,196 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+import botocore
+
+from ..models import OutboxMessage
+from ..sqs import (
+    OUTBOX_RELAY_RETRIES, SQSBatchPublisher, encode_payload, relay_outbox, send_batch_to_sqs, send_to_sqs
+)
+
+
+@override_settings(BASKET_SQS_QUEUE_URL='sqs.us-east-1.amazonaws.com/1234567890/test')
+class SQSBatchPublisherTestCase(TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+
+    def test_encode_payload_uses_django_json_encoder(self):
+        self.assertEqual(encode_payload({'b': Decimal('10.5'), 'a': 1}), '{"a": 1, "b": "10.5"}')
+
+    def test_flush_sends_payloads_in_batches_of_ten(self):
+        publisher = SQSBatchPublisher(client=self.client)
+        publisher.buffer = [{'data': {'id': i}} for i in range(23)]
+        failed = publisher.flush()
+
+        self.assertEqual(failed, [])
+        self.assertEqual(self.client.send_message_batch.call_count, 3)
+        first_call = self.client.send_message_batch.call_args_list[0]
+        self.assertEqual(len(first_call[1]['Entries']), 10)
+        self.assertEqual(first_call[1]['Entries'][0], {'Id': '0', 'MessageBody': '{"data": {"id": 0}}'})
+        self.assertIsNotNone(publisher.last_flush_latency)
+
+    def test_add_flushes_when_buffer_is_full(self):
+        publisher = SQSBatchPublisher(client=self.client, batch_size=2)
+        publisher.add({'data': 1})
+        self.client.send_message_batch.assert_not_called()
+        publisher.add({'data': 2})
+        self.client.send_message_batch.assert_called_once()
+        self.assertEqual(publisher.buffer, [])
+
+    def test_flush_with_empty_buffer_does_nothing(self):
+        self.assertEqual(SQSBatchPublisher(client=self.client).flush(), [])
+        self.client.send_message_batch.assert_not_called()
+
+    def test_failed_entries_are_requeued_with_delay(self):
+        self.client.send_message_batch.return_value = {
+            'Successful': [{'Id': '0'}],
+            'Failed': [
+                {'Id': '1', 'SenderFault': False, 'Code': 'InternalError'},
+                {'Id': '2', 'SenderFault': True, 'Code': 'InvalidMessageContents'},
+            ],
+        }
+        publisher = SQSBatchPublisher(client=self.client)
+        publisher.buffer = [{'data': 0}, {'data': 1}, {'data': 2}]
+        with mock.patch('donate.payments.sqs.enqueue_in') as mock_enqueue_in:
+            failed = publisher.flush()
+
+        # Sender faults are dropped, the rest are retried
+        self.assertEqual(failed, [{'data': 1}])
+        mock_enqueue_in.assert_called_once()
+        self.assertEqual(mock_enqueue_in.call_args[0][1:], (send_batch_to_sqs, [{'data': 1}]))
+        self.assertEqual(mock_enqueue_in.call_args[1], {'attempt': 1})
+
+    def test_client_error_retries_whole_batch(self):
+        self.client.send_message_batch.side_effect = botocore.exceptions.ClientError({}, 'SendMessageBatch')
+        publisher = SQSBatchPublisher(client=self.client)
+        publisher.buffer = [{'data': 0}, {'data': 1}]
+        with mock.patch('donate.payments.sqs.enqueue_in') as mock_enqueue_in:
+            self.assertEqual(publisher.flush(), [{'data': 0}, {'data': 1}])
+        mock_enqueue_in.assert_called_once()
+
+    def test_gives_up_after_last_attempt(self):
+        self.client.send_message_batch.side_effect = botocore.exceptions.ClientError({}, 'SendMessageBatch')
+        publisher = SQSBatchPublisher(client=self.client, attempt=2)
+        publisher.buffer = [{'data': 0}]
+        with mock.patch('donate.payments.sqs.enqueue_in') as mock_enqueue_in:
+            with mock.patch('donate.payments.sqs.logger') as mock_logger:
+                publisher.flush()
+        mock_enqueue_in.assert_not_called()
+        mock_logger.error.assert_called()
+
+    def test_send_batch_to_sqs_publishes_payloads(self):
+        with mock.patch('donate.payments.sqs.sqs_client', return_value=self.client):
+            send_batch_to_sqs([{'data': {'event_type': 'donation'}}])
+        self.client.send_message_batch.assert_called_once_with(
+            QueueUrl='sqs.us-east-1.amazonaws.com/1234567890/test',
+            Entries=[{'Id': '0', 'MessageBody': '{"data": {"event_type": "donation"}}'}],
+        )
+
+
+@override_settings(BASKET_SQS_QUEUE_URL='sqs.us-east-1.amazonaws.com/1234567890/test')
+class SQSOutboxTestCase(TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+        patcher = mock.patch('donate.payments.sqs.sqs_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_send_to_sqs_writes_to_outbox(self):
+        send_to_sqs({'data': {'event_type': 'donation'}})
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.body, '{"data": {"event_type": "donation"}}')
+        self.assertEqual(message.status, OutboxMessage.STATUS_PENDING)
+        self.client.send_message_batch.assert_not_called()
+
+    @override_settings(BASKET_SQS_QUEUE_URL='')
+    def test_send_to_sqs_does_nothing_without_queue_url(self):
+        send_to_sqs({'data': {}})
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_relay_sends_pending_messages_in_order(self):
+        for i in range(12):
+            send_to_sqs({'data': {'id': i}})
+
+        self.assertEqual(relay_outbox(), 12)
+
+        self.assertEqual(self.client.send_message_batch.call_count, 2)
+        entries = self.client.send_message_batch.call_args_list[0][1]['Entries']
+        first = OutboxMessage.objects.first()
+        self.assertEqual(entries[0]['Id'], str(first.pk))
+        self.assertEqual(entries[0]['MessageBody'], '{"data": {"id": 0}}')
+        self.assertEqual(
+            entries[0]['MessageAttributes']['DeduplicationId']['StringValue'], f'outbox-{first.pk}'
+        )
+        self.assertFalse(OutboxMessage.objects.filter(status=OutboxMessage.STATUS_PENDING).exists())
+
+    def test_relay_stops_at_failed_batch(self):
+        send_to_sqs({'data': 0})
+        send_to_sqs({'data': 1})
+        first, second = OutboxMessage.objects.all()
+        self.client.send_message_batch.return_value = {
+            'Successful': [{'Id': str(first.pk)}],
+            'Failed': [{'Id': str(second.pk), 'SenderFault': False, 'Code': 'InternalError'}],
+        }
+
+        with mock.patch('donate.payments.sqs.enqueue_in') as mock_enqueue_in:
+            self.assertEqual(relay_outbox(), 1)
+
+        mock_enqueue_in.assert_called_once()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, OutboxMessage.STATUS_SENT)
+        self.assertIsNotNone(first.sent_at)
+        self.assertEqual(second.status, OutboxMessage.STATUS_PENDING)
+        self.assertEqual(second.attempts, 1)
+
+    def test_relay_marks_rejected_messages(self):
+        send_to_sqs({'data': 0})
+        message = OutboxMessage.objects.get()
+        self.client.send_message_batch.return_value = {
+            'Successful': [],
+            'Failed': [{'Id': str(message.pk), 'SenderFault': True, 'Code': 'InvalidMessageContents'}],
+        }
+
+        self.assertEqual(relay_outbox(), 0)
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.STATUS_REJECTED)
+        self.assertIn('InvalidMessageContents', message.last_error)
+
+    def test_relay_gives_up_retrying_after_last_attempt(self):
+        send_to_sqs({'data': 0})
+        message = OutboxMessage.objects.get()
+        self.client.send_message_batch.return_value = {
+            'Successful': [],
+            'Failed': [{'Id': str(message.pk), 'SenderFault': False, 'Code': 'InternalError'}],
+        }
+
+        with mock.patch('donate.payments.sqs.enqueue_in') as mock_enqueue_in:
+            with mock.patch('donate.payments.sqs.logger') as mock_logger:
+                self.assertEqual(relay_outbox(attempt=OUTBOX_RELAY_RETRIES - 1), 0)
+
+        mock_enqueue_in.assert_not_called()
+        mock_logger.error.assert_called()
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.STATUS_PENDING)
+
+    def test_relay_does_nothing_while_another_relay_runs(self):
+        send_to_sqs({'data': 0})
+        with mock.patch('donate.payments.sqs.outbox_relay_lock') as mock_lock:
+            mock_lock.return_value.__enter__.return_value = False
+            self.assertEqual(relay_outbox(), 0)
+
+        self.client.send_message_batch.assert_not_called()
+        self.assertEqual(OutboxMessage.objects.get().status, OutboxMessage.STATUS_PENDING)
+
+    def test_relay_lock_is_released(self):
+        send_to_sqs({'data': 0})
+        relay_outbox()
+        send_to_sqs({'data': 1})
+        self.assertEqual(relay_outbox(), 1)
@@ -0,0 +1,87 @@
+import hashlib
+import hmac
+import json
+import time
+from unittest import mock
+
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..stripe_webhooks import StripeWebhookView
+from ..tasks import process_stripe_webhook
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+def sign(payload, secret=WEBHOOK_SECRET, timestamp=None):
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(
+        secret.encode('utf-8'), f'{timestamp}.{payload}'.encode('utf-8'), hashlib.sha256
+    ).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+@mock.patch('donate.payments.stripe_webhooks.is_new_event', return_value=True)
+class StripeWebhookViewTestCase(TestCase):
+
+    payload = json.dumps({'id': 'evt_1', 'type': 'charge.succeeded'})
+
+    def post(self, payload, signature):
+        request = RequestFactory().post(
+            '/stripe/webhook/', payload, content_type='application/json', HTTP_STRIPE_SIGNATURE=signature
+        )
+        with mock.patch('donate.payments.stripe_webhooks.enqueue') as mock_enqueue:
+            response = StripeWebhookView.as_view()(request)
+        return response, mock_enqueue
+
+    def test_signed_event_is_queued_as_raw_body(self, mock_is_new_event):
+        response, mock_enqueue = self.post(self.payload, sign(self.payload))
+
+        self.assertEqual(response.status_code, 200)
+        mock_is_new_event.assert_called_once_with('stripe', 'evt_1')
+        mock_enqueue.assert_called_once_with(process_stripe_webhook, self.payload.encode('utf-8'), 'evt_1')
+
+    def test_missing_signature_returns_400(self, mock_is_new_event):
+        response, mock_enqueue = self.post(self.payload, '')
+
+        self.assertEqual(response.status_code, 400)
+        mock_enqueue.assert_not_called()
+
+    def test_invalid_signature_returns_400(self, mock_is_new_event):
+        response, mock_enqueue = self.post(self.payload, sign(self.payload, secret='whsec_other'))
+
+        self.assertEqual(response.status_code, 400)
+        mock_is_new_event.assert_not_called()
+        mock_enqueue.assert_not_called()
+
+    def test_expired_signature_returns_400(self, mock_is_new_event):
+        response, mock_enqueue = self.post(self.payload, sign(self.payload, timestamp=int(time.time()) - 3600))
+
+        self.assertEqual(response.status_code, 400)
+        mock_enqueue.assert_not_called()
+
+    def test_signed_payload_without_event_id_returns_400(self, mock_is_new_event):
+        payload = json.dumps({'type': 'charge.succeeded'})
+        response, mock_enqueue = self.post(payload, sign(payload))
+
+        self.assertEqual(response.status_code, 400)
+        mock_enqueue.assert_not_called()
+
+    def test_duplicate_event_is_acknowledged_without_queueing(self, mock_is_new_event):
+        mock_is_new_event.return_value = False
+        response, mock_enqueue = self.post(self.payload, sign(self.payload))
+
+        self.assertEqual(response.status_code, 200)
+        mock_enqueue.assert_not_called()
+
+    def test_event_is_forgotten_if_queueing_fails(self, mock_is_new_event):
+        request = RequestFactory().post(
+            '/stripe/webhook/', self.payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=sign(self.payload)
+        )
+        with mock.patch('donate.payments.stripe_webhooks.enqueue', side_effect=ConnectionError):
+            with mock.patch('donate.payments.stripe_webhooks.forget_event') as mock_forget_event:
+                with self.assertRaises(ConnectionError):
+                    StripeWebhookView.as_view()(request)
+
+        mock_forget_event.assert_called_once_with('stripe', 'evt_1')
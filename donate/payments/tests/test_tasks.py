@@ -2,13 +2,14 @@ from decimal import Decimal
 from unittest import mock
 import stripe
 
+from django.core.cache import cache
 from django.test import TestCase, override_settings
 
 from freezegun import freeze_time
 
 from ..tasks import (
-    BraintreeWebhookProcessor, send_newsletter_subscription_to_basket, send_transaction_to_basket,
-    StripeWebhookProcessor)
+    BraintreeWebhookProcessor, process_donation_receipt, send_newsletter_subscription_to_basket,
+    process_stripe_webhook, send_transaction_to_basket, StripeWebhookProcessor, update_customer)
 
 
 class NewsletterSignupTestCase(TestCase):
@@ -103,8 +104,71 @@ class BasketTransactionTestCase(TestCase):
         self._test_sqs_payload()
 
 
+@freeze_time("2019-08-08 00:00:00", tz_offset=0)
+class DonationReceiptTestCase(TestCase):
+
+    def setUp(self):
+        self.donation_data = {
+            'email': 'test@example.com',
+            'first_name': 'Bob',
+            'last_name': 'Bobbertson',
+            'amount': Decimal(10),
+            'currency': 'usd',
+            'transaction_id': 'transaction-1',
+            'locale': 'en-US',
+            'project': 'mozillafoundation',
+        }
+
+    def test_receipt_sent_immediately(self):
+        with mock.patch('donate.payments.tasks.acoustic_tx', autospec=True) as mock_acoustic:
+            process_donation_receipt(self.donation_data)
+        mock_acoustic.send_mail.assert_called_once()
+        mock_acoustic.queue_mail.assert_not_called()
+
+    @override_settings(ACOUSTIC_TX_BATCH_RECEIPTS=True)
+    def test_receipt_queued_for_batch(self):
+        with mock.patch('donate.payments.tasks.acoustic_tx', autospec=True) as mock_acoustic:
+            process_donation_receipt(self.donation_data)
+        mock_acoustic.send_mail.assert_not_called()
+        mock_acoustic.queue_mail.assert_called_once()
+        email, campaign_id, fields = mock_acoustic.queue_mail.call_args[0]
+        self.assertEqual(email, 'test@example.com')
+        self.assertEqual(fields['donation_amount'], '10.00')
+        self.assertEqual(mock_acoustic.queue_mail.call_args[1], {'save_to_db': True})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
 class ProcessWebhookTestCase(TestCase):
 
+    def setUp(self):
+        # Customer custom fields are cached between webhooks
+        cache.clear()
+
+    def test_process_stripe_webhook_builds_event_from_raw_body(self):
+        payload = b'{"id": "evt_1", "object": "event", "type": "charge.succeeded"}'
+        with mock.patch.object(StripeWebhookProcessor, 'process') as mock_process:
+            process_stripe_webhook(payload, 'evt_1')
+
+        event = mock_process.call_args[0][0]
+        self.assertIsInstance(event, stripe.Event)
+        self.assertEqual(event.id, 'evt_1')
+        self.assertEqual(event.type, 'charge.succeeded')
+
+    def test_process_stripe_webhook_accepts_jobs_queued_by_earlier_releases(self):
+        payload = {'id': 'evt_1', 'object': 'event', 'type': 'charge.succeeded'}
+        with mock.patch.object(StripeWebhookProcessor, 'process') as mock_process:
+            process_stripe_webhook(payload, signature='t=1,v1=signature')
+
+        self.assertEqual(mock_process.call_args[0][0].id, 'evt_1')
+
+    def test_process_stripe_webhook_logs_invalid_payload(self):
+        with mock.patch('donate.payments.tasks.logger') as mock_logger:
+            with mock.patch.object(StripeWebhookProcessor, 'process') as mock_process:
+                process_stripe_webhook(b'not json', 'evt_1')
+
+        mock_process.assert_not_called()
+        mock_logger.error.assert_called_once()
+
     def test_processor_calls_method_based_on_kind(self):
         notification = mock.Mock()
         notification.kind = 'subscription_charged_unsuccessfully'
@@ -172,6 +236,35 @@ class ProcessWebhookTestCase(TestCase):
             }
         })
 
+    def test_customer_custom_fields_are_cached_by_payment_method_token(self):
+        with mock.patch('donate.payments.tasks.gateway', autospec=True) as mock_gateway:
+            mock_payment_method = mock.Mock()
+            mock_payment_method.customer_id = 'customer-1'
+            mock_gateway.payment_method.find.return_value = mock_payment_method
+            mock_customer = mock.Mock()
+            mock_customer.custom_fields = {
+                'campaign_id': 'PIDAY',
+                'project': 'mozillafoundation',
+            }
+            mock_gateway.customer.find.return_value = mock_customer
+
+            first = BraintreeWebhookProcessor.get_customer_custom_fields('token-1')
+            second = BraintreeWebhookProcessor.get_customer_custom_fields('token-1')
+
+        self.assertEqual(first, {'campaign_id': 'PIDAY', 'project': 'mozillafoundation'})
+        self.assertEqual(second, first)
+        mock_gateway.payment_method.find.assert_called_once_with('token-1')
+        mock_gateway.customer.find.assert_called_once_with('customer-1')
+
+    def test_update_customer_invalidates_cached_custom_fields(self):
+        cache.set('braintree:customer_fields:token-1', {'project': 'thunderbird'})
+        with mock.patch('donate.payments.tasks.gateway', autospec=True) as mock_gateway:
+            update_customer('customer-1', 'token-1', {'custom_fields': {'project': 'mozillafoundation'}})
+        mock_gateway.customer.update.assert_called_once_with(
+            'customer-1', {'custom_fields': {'project': 'mozillafoundation'}}
+        )
+        self.assertIsNone(cache.get('braintree:customer_fields:token-1'))
+
     @freeze_time("2019-08-08 00:00:00", tz_offset=0)
     def test_subscription_without_project_update_fail(self):
         notification = mock.Mock()
@@ -369,7 +462,7 @@ class ProcessStripeWebhookTestCase(TestCase):
         mock_charge.balance_transaction.amount = 1000
         mock_charge.balance_transaction.net = 950
         mock_charge.balance_transaction.fee = 50
-        mock_charge.invoice.subscription = 'test-subscription-id'
+        mock_charge.invoice.subscription = self.get_mock_subscription()
 
         if failure_code:
             mock_charge.failure_code = failure_code
@@ -425,21 +518,56 @@ class ProcessStripeWebhookTestCase(TestCase):
 
         mock_process_method.assert_not_called()
 
+    def test_processor_logs_api_calls(self):
+        event = self.get_mock_event('charge.dispute.created')
+
+        with mock.patch('donate.payments.tasks.logger') as mock_logger:
+            with mock.patch.object(
+                    StripeWebhookProcessor, 'process_charge_dispute_created'
+            ):
+                StripeWebhookProcessor().process(event)
+
+        self.assertIn('with 0 API call(s)', mock_logger.info.call_args[0][0])
+
     @freeze_time('2019-11-26 00:00:00', tz_offset=0)
     def test_process_charge_succeeded(self):
         mock_event = self.get_mock_event()
         mock_charge = self.get_mock_charge()
-        mock_subscription = self.get_mock_subscription()
 
         with mock.patch('donate.payments.tasks.send_to_sqs', autospec=True) as mock_send:
             with mock.patch('donate.payments.tasks.stripe', autospec=True) as mock_stripe:
                 mock_stripe.Charge.retrieve.return_value = mock_charge
                 mock_stripe.Charge.modify = mock.Mock()
-                mock_stripe.Subscription.retrieve.return_value = mock_subscription
                 mock_stripe.error.StripeError = stripe.error.StripeError
-                StripeWebhookProcessor().process_charge_succeeded(mock_event)
+                processor = StripeWebhookProcessor()
+                processor.process_charge_succeeded(mock_event)
             mock_send.assert_called_once()
 
+        # The subscription and customer come expanded on the charge, in a single request
+        mock_stripe.Charge.retrieve.assert_called_once_with(
+            'test-charge-id', expand=['invoice.subscription.customer', 'balance_transaction']
+        )
+        mock_stripe.Subscription.retrieve.assert_not_called()
+        self.assertEqual(processor.api_calls, 2)
+
+    @freeze_time('2019-11-26 00:00:00', tz_offset=0)
+    def test_charge_succeeded_reuses_expanded_event_objects(self):
+        invoice = stripe.Invoice.construct_from({
+            'id': 'test-invoice-id',
+            'subscription': {'id': 'test-subscription-id', 'customer': {'id': 'test-customer-id'}},
+        }, 'sk_test')
+        charge = stripe.Charge.construct_from({
+            'id': 'test-charge-id',
+            'balance_transaction': {'id': 'test-balance-transaction-id'},
+        }, 'sk_test')
+        charge.invoice = invoice
+        mock_event = self.get_mock_event()
+        mock_event.data.object = charge
+
+        with mock.patch('donate.payments.tasks.stripe', autospec=True) as mock_stripe:
+            self.assertIs(StripeWebhookProcessor().prefetch(mock_event, ['invoice.subscription.customer']), charge)
+            mock_stripe.Charge.retrieve.assert_not_called()
+
     @freeze_time('2019-11-26 00:00:00', tz_offset=0)
     def test_charge_retrieve_failed(self):
         mock_event = self.get_mock_event()
@@ -481,30 +609,14 @@ class ProcessStripeWebhookTestCase(TestCase):
                 StripeWebhookProcessor().process_charge_succeeded(mock_event)
             mock_logger.info.assert_called_once_with('This charge is not associated with a subscription')
 
-    @freeze_time('2019-11-26 00:00:00', tz_offset=0)
-    def test_subscription_retrieve_failed(self):
-        mock_event = self.get_mock_event()
-        mock_charge = self.get_mock_charge()
-
-        with mock.patch('donate.payments.tasks.logger', autospec=True) as mock_logger:
-            with mock.patch('donate.payments.tasks.stripe', autospec=True) as mock_stripe:
-                mock_stripe.Charge.retrieve.return_value = mock_charge
-                mock_stripe.Charge.modify = mock.Mock()
-                mock_stripe.Subscription.retrieve.side_effect = stripe.error.StripeError
-                mock_stripe.error.StripeError = stripe.error.StripeError
-                StripeWebhookProcessor().process_charge_succeeded(mock_event)
-            mock_logger.error.assert_called_once()
-
     @freeze_time('2019-11-26 00:00:00', tz_offset=0)
     def test_charge_modify_failed(self):
         mock_event = self.get_mock_event()
         mock_charge = self.get_mock_charge()
-        mock_subscription = self.get_mock_subscription()
 
         with mock.patch('donate.payments.tasks.logger', autospec=True) as mock_logger:
             with mock.patch('donate.payments.tasks.stripe', autospec=True) as mock_stripe:
                 mock_stripe.Charge.retrieve.return_value = mock_charge
-                mock_stripe.Subscription.retrieve.return_value = mock_subscription
                 mock_stripe.Charge.modify = mock.Mock()
                 mock_stripe.Charge.modify.side_effect = stripe.error.StripeError
                 mock_stripe.error.StripeError = stripe.error.StripeError
@@ -606,14 +718,18 @@ class ProcessStripeWebhookTestCase(TestCase):
         mock_event = self.get_mock_event(type='charge.failed')
         mock_charge = self.get_mock_charge(failure_code='processing_error')
         mock_charge.invoice = 'test-invoice-id'
-        mock_invoice = self.get_mock_invoice()
         mock_event.data.object = mock_charge
+        mock_expanded_charge = self.get_mock_charge(failure_code='processing_error')
+        mock_expanded_charge.invoice = self.get_mock_invoice()
 
         with mock.patch('donate.payments.tasks.send_to_sqs', autospec=True) as mock_send:
             with mock.patch('donate.payments.tasks.stripe', autospec=True) as mock_stripe:
-                mock_stripe.Invoice.retrieve.return_value = mock_invoice
+                mock_stripe.Charge.retrieve.return_value = mock_expanded_charge
                 StripeWebhookProcessor().process_charge_failed(mock_event)
             mock_send.assert_called_once()
+        mock_stripe.Charge.retrieve.assert_called_once_with(
+            'test-charge-id', expand=['invoice.subscription.customer']
+        )
 
     @freeze_time('2019-11-26 00:00:00', tz_offset=0)
     def test_charge_failed_no_invoice(self):
@@ -637,10 +753,10 @@ class ProcessStripeWebhookTestCase(TestCase):
 
         with mock.patch('donate.payments.tasks.logger', autospec=True) as mock_logger:
             with mock.patch('donate.payments.tasks.stripe', autospec=True) as mock_stripe:
-                mock_stripe.Invoice.retrieve.side_effect = stripe.error.StripeError
+                mock_stripe.Charge.retrieve.side_effect = stripe.error.StripeError
                 mock_stripe.error.StripeError = stripe.error.StripeError
                 with mock.patch('donate.payments.tasks.send_to_sqs', autospec=True) as mock_send:
                     StripeWebhookProcessor().process_charge_failed(mock_event)
                     mock_send.assert_not_called()
-                mock_stripe.Invoice.retrieve.assert_called_once()
+                mock_stripe.Charge.retrieve.assert_called_once()
             mock_logger.error.assert_called_once()
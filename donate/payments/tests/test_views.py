@@ -13,12 +13,12 @@ from freezegun.api import FakeDate
 from wagtail.core.models import Site
 
 from donate.core.feature_flags import FeatureFlags
-from donate.views import apple_pay_domain_association_view
+from donate.views import EnvVariablesView, apple_pay_domain_association_view
 from ..forms import (
     BraintreePaymentForm, BraintreeCardPaymentForm, BraintreePaypalPaymentForm,
     BraintreePaypalUpsellForm, UpsellForm
 )
-from ..tasks import send_transaction_to_basket
+from ..tasks import send_transaction_to_basket, set_customer_custom_fields
 from ..views import (
     BraintreePaymentMixin, CardPaymentView, CardUpsellView, NewsletterSignupView,
     PaypalPaymentView, PaypalUpsellView, TransactionRequiredMixin
@@ -369,6 +369,35 @@ class SingleCardPaymentViewTestCase(CardPaymentViewTestCase):
         self.assertEqual(self.request.session['campaign_id'], self.form_data['campaign_id'])
         self.assertEqual(self.request.session['project'], self.form_data['project'])
 
+    @override_settings(BRAINTREE_VAULT_ON_SALE=True)
+    def test_vaulted_sale_submitted_to_braintree(self):
+        form = BraintreeCardPaymentForm(self.form_data)
+        assert form.is_valid()
+        mock_result = mock.Mock(is_success=True)
+        mock_result.transaction.id = 'transaction-id-1'
+        mock_result.transaction.customer_details.id = 'customer-id-1'
+        mock_result.transaction.credit_card_details.token = 'payment-method-1'
+        mock_result.transaction.credit_card_details.last_4 = '1234'
+
+        with mock.patch('donate.payments.views.gateway', autospec=True) as mock_gateway:
+            mock_gateway.transaction.sale.return_value = mock_result
+            with mock.patch('donate.payments.views.enqueue', autospec=True) as mock_enqueue:
+                self.view.form_valid(form, send_data_to_basket=False)
+
+        mock_gateway.customer.create.assert_not_called()
+        sale_params = mock_gateway.transaction.sale.call_args[0][0]
+        self.assertEqual(sale_params['payment_method_nonce'], 'hello-braintree')
+        self.assertEqual(sale_params['customer']['email'], self.form_data['email'])
+        self.assertTrue(sale_params['options']['store_in_vault_on_success'])
+
+        custom_fields = self.view.get_custom_fields(form)
+        mock_enqueue.assert_called_once_with(
+            set_customer_custom_fields, 'customer-id-1', 'payment-method-1', custom_fields
+        )
+        self.assertEqual(
+            self.request.session['completed_transaction_details']['payment_method_token'], 'payment-method-1'
+        )
+
     def test_ga_transaction_and_event(self):
         form = BraintreeCardPaymentForm(self.form_data)
         assert form.is_valid()
@@ -996,3 +1025,19 @@ class TestApplePayDomainAssociationView(TestCase):
         response = apple_pay_domain_association_view(request)
 
         self.assertContains(response, status_code=501, text="Key not found. Please check environment variables.")
+
+
+class EnvVariablesViewTestCase(TestCase):
+
+    def test_response_has_etag_and_cache_control(self):
+        response = EnvVariablesView.as_view()(RequestFactory().get('/environment.json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertTrue(response['ETag'])
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = EnvVariablesView.as_view()(RequestFactory().get('/environment.json'))['ETag']
+        response = EnvVariablesView.as_view()(RequestFactory().get('/environment.json', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
@@ -0,0 +1,41 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from redis.exceptions import ConnectionError
+
+from ..webhook_dedupe import get_dedupe_stats, is_new_event, payload_fingerprint
+
+
+class WebhookDedupeTestCase(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('donate.payments.webhook_dedupe.get_redis_connection')
+        self.mock_connection = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_first_delivery_is_new(self):
+        self.mock_connection.set.return_value = True
+        self.assertTrue(is_new_event('stripe', 'evt_1'))
+        self.mock_connection.set.assert_called_once_with('webhook:seen:stripe:evt_1', 1, nx=True, ex=345600)
+        self.mock_connection.incr.assert_called_once_with('webhook:dedupe:stripe:misses')
+
+    def test_redelivery_is_not_new(self):
+        self.mock_connection.set.return_value = None
+        self.assertFalse(is_new_event('stripe', 'evt_1'))
+        self.mock_connection.incr.assert_called_once_with('webhook:dedupe:stripe:hits')
+
+    def test_redis_failure_treats_event_as_new(self):
+        self.mock_connection.set.side_effect = ConnectionError
+        self.assertTrue(is_new_event('braintree', 'abc'))
+
+    def test_payload_fingerprint_is_stable(self):
+        self.assertEqual(payload_fingerprint('payload'), payload_fingerprint('payload'))
+        self.assertNotEqual(payload_fingerprint('payload'), payload_fingerprint('other'))
+
+    def test_get_dedupe_stats(self):
+        self.mock_connection.mget.return_value = [b'3', b'10', None, b'7']
+        self.assertEqual(get_dedupe_stats(), {
+            'stripe': {'hits': 3, 'misses': 10},
+            'braintree': {'hits': 0, 'misses': 7},
+        })
@@ -15,9 +15,9 @@ from braintree import ErrorCodes
 import mailchimp_marketing as MailchimpMarketing
 from mailchimp_marketing.api_client import ApiClientError
 from dateutil.relativedelta import relativedelta
-from wagtail.core.models import Page
 
 from donate.core.feature_flags import FeatureFlags
+from donate.core.queues import enqueue
 from donate.core.utils import queue_ga_event, queue_datalayer_event
 from . import constants, gateway
 from .exceptions import InvalidAddress
@@ -25,7 +25,9 @@ from .forms import (
     BraintreeCardPaymentForm, BraintreePaypalPaymentForm, BraintreePaypalUpsellForm,
     NewsletterSignupForm, StartCardPaymentForm, UpsellForm
 )
-from .tasks import queue, send_newsletter_subscription_to_basket, send_transaction_to_basket
+from .tasks import (
+    send_newsletter_subscription_to_basket, send_transaction_to_basket, set_customer_custom_fields
+)
 from .utils import (
     get_currency_info, get_merchant_account_id_for_card, get_merchant_account_id_for_paypal, get_plan_id,
     get_suggested_monthly_upgrade, freeze_transaction_details_for_session
@@ -80,7 +82,7 @@ class BraintreePaymentMixin:
     def handle_successful_transaction(self, result, form, send_data_to_basket=True, **kwargs):
         details = self.set_session_data(result, form, **kwargs)
         if send_data_to_basket:
-            queue.enqueue(send_transaction_to_basket, details)
+            enqueue(send_transaction_to_basket, details)
         return HttpResponseRedirect(self.get_success_url())
 
     def queue_ga_transaction(self, id, currency, amount, name, category):
@@ -147,15 +149,15 @@ class CardPaymentView(BraintreePaymentMixin, FormView):
 
         self.amount = start_form.cleaned_data['amount']
         self.currency = start_form.cleaned_data['currency']
-        self.source_page = Page.objects.get(pk=start_form.cleaned_data['source_page_id']).specific
+        self.source_page_info = start_form.source_page_info
         return super().dispatch(request, *args, **kwargs)
 
     def get_initial(self):
         return {
             'amount': self.amount,
             'landing_url': self.request.META.get('HTTP_REFERER', ''),
-            'project': self.source_page.project,
-            'campaign_id': self.source_page.campaign_id,
+            'project': self.source_page_info['project'],
+            'campaign_id': self.source_page_info['campaign_id'],
         }
 
     def get_context_data(self, **kwargs):
@@ -279,25 +281,65 @@ class CardPaymentView(BraintreePaymentMixin, FormView):
 
         return result
 
-    def process_single_transaction(self, form, send_data_to_basket=True):
-        # Create a customer and payment method for this customer
-        # We vault this customer so that upsell doesn't require further authorization
-        result = self.create_customer(form)
-        if result.is_success:
-            payment_method = result.customer.payment_methods[0]
-        else:
-            return self.process_braintree_error_result(result, form)
-
+    def create_vaulted_sale(self, form):
+        """
+        Charge the card and vault it in a single request. Braintree creates the customer
+        as part of the sale, but can't set its custom fields, which the webhooks for an
+        upsell subscription rely on, so they are set by a background job.
+        """
+        custom_fields = self.get_custom_fields(form)
         result = gateway.transaction.sale({
             'amount': form.cleaned_data['amount'],
             'merchant_account_id': get_merchant_account_id_for_card(self.currency),
-            'payment_method_token': payment_method.token,
+            'payment_method_nonce': form.cleaned_data['braintree_nonce'],
+            'customer': {
+                'first_name': form.cleaned_data['first_name'],
+                'last_name': form.cleaned_data['last_name'],
+                'email': form.cleaned_data['email'],
+            },
+            'billing': self.get_address_info(form.cleaned_data),
+            'custom_fields': custom_fields,
             'options': {
-                'submit_for_settlement': True
+                'submit_for_settlement': True,
+                'store_in_vault_on_success': True,
+                'add_billing_address_to_payment_method': True,
             },
             'device_data': form.cleaned_data['device_data'],
         })
 
+        if result.is_success:
+            enqueue(
+                set_customer_custom_fields,
+                result.transaction.customer_details.id,
+                result.transaction.credit_card_details.token,
+                custom_fields,
+            )
+
+        return result
+
+    def process_single_transaction(self, form, send_data_to_basket=True):
+        if settings.BRAINTREE_VAULT_ON_SALE:
+            result = self.create_vaulted_sale(form)
+            payment_method_token = result.transaction.credit_card_details.token if result.is_success else None
+        else:
+            # Create a customer and payment method for this customer
+            # We vault this customer so that upsell doesn't require further authorization
+            result = self.create_customer(form)
+            if result.is_success:
+                payment_method_token = result.customer.payment_methods[0].token
+            else:
+                return self.process_braintree_error_result(result, form)
+
+            result = gateway.transaction.sale({
+                'amount': form.cleaned_data['amount'],
+                'merchant_account_id': get_merchant_account_id_for_card(self.currency),
+                'payment_method_token': payment_method_token,
+                'options': {
+                    'submit_for_settlement': True
+                },
+                'device_data': form.cleaned_data['device_data'],
+            })
+
         if result.is_success:
             self.queue_ga_transaction(
                 id=result.transaction.id,
@@ -322,7 +364,7 @@ class CardPaymentView(BraintreePaymentMixin, FormView):
             return self.handle_successful_transaction(
                 result,
                 form,
-                payment_method_token=payment_method.token,
+                payment_method_token=payment_method_token,
                 transaction_id=result.transaction.id,
                 settlement_amount=result.transaction.disbursement_details.settlement_amount,
                 last_4=result.transaction.credit_card_details.last_4,
@@ -890,7 +932,7 @@ class NewsletterSignupView(TransactionRequiredMixin, FormView):
         elif send_data_to_basket:
             data['source_url'] = self.request.build_absolute_uri()
             data['lang'] = self.request.LANGUAGE_CODE
-            queue.enqueue(send_newsletter_subscription_to_basket, data)
+            enqueue(send_newsletter_subscription_to_basket, data)
 
             queue_ga_event(self.request, ['send', 'event', {
                     'eventCategory': 'Signup',
@@ -0,0 +1,72 @@
+"""
+Redis index of webhook events that have already been queued for processing.
+
+Stripe and Braintree both redeliver events, so every event ID is recorded with a
+TTL that outlasts the gateways' retry windows, and a redelivered event is
+acknowledged without queueing another job.
+"""
+import hashlib
+import logging
+
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Stripe retries failed deliveries for up to three days
+DEDUPE_TTL = 60 * 60 * 24 * 4  # seconds
+KEY_PREFIX = 'webhook:seen'
+STATS_KEY_PREFIX = 'webhook:dedupe'
+SOURCES = ('stripe', 'braintree')
+
+
+def payload_fingerprint(payload):
+    """
+    Braintree notifications have no event ID, but a redelivery carries the exact same
+    payload, so a hash of it serves as one.
+    """
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def is_new_event(source, event_id):
+    """
+    Record the event and return True if it hasn't been seen in the last DEDUPE_TTL seconds.
+
+    If Redis is unavailable the event is treated as new: processing a duplicate is
+    better than dropping a donation.
+    """
+    try:
+        connection = get_redis_connection('default')
+        is_new = bool(connection.set(f'{KEY_PREFIX}:{source}:{event_id}', 1, nx=True, ex=DEDUPE_TTL))
+        connection.incr(f'{STATS_KEY_PREFIX}:{source}:{"misses" if is_new else "hits"}')
+    except RedisError:
+        logger.exception('Could not check the webhook dedupe index')
+        return True
+
+    if not is_new:
+        logger.info(f'Ignoring duplicate {source} webhook event: {event_id}')
+
+    return is_new
+
+
+def forget_event(source, event_id):
+    """
+    Remove an event from the index, so that a redelivery is processed.
+    Used when the event could not be queued after it was recorded.
+    """
+    try:
+        get_redis_connection('default').delete(f'{KEY_PREFIX}:{source}:{event_id}')
+    except RedisError:
+        logger.exception('Could not update the webhook dedupe index')
+
+
+def get_dedupe_stats():
+    """
+    Return {source: {'hits': n, 'misses': n}}, where hits are duplicates that were skipped.
+    """
+    keys = [f'{STATS_KEY_PREFIX}:{source}:{kind}' for source in SOURCES for kind in ('hits', 'misses')]
+    values = iter(get_redis_connection('default').mget(keys))
+    return {
+        source: {kind: int(next(values) or 0) for kind in ('hits', 'misses')}
+        for source in SOURCES
+    }
@@ -2,7 +2,7 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
-from .utils import verify
+from .utils import verify, verify_async
 
 
 class ReCaptchaField(forms.CharField):
@@ -12,8 +12,33 @@ class ReCaptchaField(forms.CharField):
         super().__init__()
         self.required = True
         self.recaptcha_secret = kwargs.get('secret', '')
+        self.pending_verification = None
+
+    def start_verification(self, value):
+        if value:
+            self.pending_verification = (value, verify_async(value, self.recaptcha_secret))
 
     def validate(self, value):
         super().validate(value)
-        if not verify(value, self.recaptcha_secret):
+        pending_verification, self.pending_verification = self.pending_verification, None
+        if pending_verification and pending_verification[0] == value:
+            is_valid = pending_verification[1].result()
+        else:
+            is_valid = verify(value, self.recaptcha_secret)
+
+        if not is_valid:
             raise ValidationError(_("Captcha was invalid. Please try again."))
+
+
+class ReCaptchaFormMixin:
+    """
+    Start verifying captcha tokens before the form is cleaned, so that the request to
+    Google runs while the other fields are validated.
+    """
+
+    def full_clean(self):
+        if self.is_bound:
+            for name, field in self.fields.items():
+                if isinstance(field, ReCaptchaField):
+                    field.start_verification(self[name].data)
+        super().full_clean()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from donate.recaptcha.utils import get_latency_histogram
+
+
+class Command(BaseCommand):
+    help = 'Show a histogram of how long reCAPTCHA verification requests have taken.'
+
+    def handle(self, *args, **options):
+        histogram = get_latency_histogram()
+        total = sum(histogram.values())
+        for bucket, count in histogram.items():
+            share = count / total * 100 if total else 0
+            self.stdout.write(f'<= {bucket}s: {count} ({share:.1f}%)')
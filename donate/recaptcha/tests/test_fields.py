@@ -1,9 +1,14 @@
 from unittest import mock
 
+from django import forms
 from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-from ..fields import ReCaptchaField
+from ..fields import ReCaptchaField, ReCaptchaFormMixin
+
+
+class ReCaptchaTestForm(ReCaptchaFormMixin, forms.Form):
+    captcha = ReCaptchaField(secret='a-secret')
 
 
 class RecaptchaFieldTestCase(TestCase):
@@ -18,3 +23,12 @@ class RecaptchaFieldTestCase(TestCase):
         with mock.patch('donate.recaptcha.fields.verify', autospec=True) as mock_verify:
             mock_verify.return_value = True
             self.assertIsNone(ReCaptchaField().validate('foo'))
+
+    def test_form_starts_verification_before_cleaning(self):
+        with mock.patch('donate.recaptcha.fields.verify_async', autospec=True) as mock_verify_async:
+            with mock.patch('donate.recaptcha.fields.verify', autospec=True) as mock_verify:
+                mock_verify_async.return_value.result.return_value = True
+                self.assertTrue(ReCaptchaTestForm({'captcha': 'foo'}).is_valid())
+
+        mock_verify_async.assert_called_once_with('foo', 'a-secret')
+        mock_verify.assert_not_called()
@@ -1,29 +1,67 @@
 from unittest import mock
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
 from requests.exceptions import RequestException
 
-from ..utils import verify
+from ..utils import get_latency_bucket, verify, verify_async
 
 
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
 class RecaptchaVerifyTestCase(TestCase):
 
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('donate.recaptcha.utils.get_session')
+        self.mock_session = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('donate.recaptcha.utils.get_redis_connection')
+        self.mock_connection = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
     def test_verify_successful(self):
-        with mock.patch('donate.recaptcha.utils.requests', autospec=True) as mock_requests:
-            mock_requests.post.return_value.json.return_value = {
-                'success': True
-            }
-            self.assertTrue(verify('a-token', 'a-secret'))
+        self.mock_session.post.return_value.json.return_value = {
+            'success': True
+        }
+        self.assertTrue(verify('a-token', 'a-secret'))
+        self.assertEqual(self.mock_session.post.call_args[1]['timeout'], (2, 3))
 
     def test_verify_unsuccessful(self):
-        with mock.patch('donate.recaptcha.utils.requests', autospec=True) as mock_requests:
-            mock_requests.post.return_value.json.return_value = {
-                'success': False
-            }
-            self.assertFalse(verify('a-token', 'a-secret'))
+        self.mock_session.post.return_value.json.return_value = {
+            'success': False
+        }
+        self.assertFalse(verify('a-token', 'a-secret'))
 
     def test_verify_returns_true_if_request_failed(self):
-        with mock.patch('donate.recaptcha.utils.requests', autospec=True) as mock_requests:
-            mock_requests.post.side_effect = RequestException()
-            self.assertTrue(verify('a-token', 'a-secret'))
+        self.mock_session.post.side_effect = RequestException()
+        self.assertTrue(verify('a-token', 'a-secret'))
+
+    def test_verdict_is_reused_once(self):
+        self.mock_session.post.return_value.json.return_value = {
+            'success': True
+        }
+        self.assertTrue(verify('a-token', 'a-secret'))
+        self.assertTrue(verify('a-token', 'a-secret'))
+        self.assertEqual(self.mock_session.post.call_count, 1)
+
+        verify('a-token', 'a-secret')
+        self.assertEqual(self.mock_session.post.call_count, 2)
+
+    def test_verify_async(self):
+        self.mock_session.post.return_value.json.return_value = {
+            'success': True
+        }
+        self.assertTrue(verify_async('a-token', 'a-secret').result())
+
+    def test_latency_is_recorded(self):
+        self.mock_session.post.return_value.json.return_value = {
+            'success': True
+        }
+        verify('a-token', 'a-secret')
+        self.mock_connection.hincrby.assert_called_once()
+
+    def test_get_latency_bucket(self):
+        self.assertEqual(get_latency_bucket(0.05), '0.1')
+        self.assertEqual(get_latency_bucket(0.3), '0.5')
+        self.assertEqual(get_latency_bucket(10), '+Inf')
@@ -1,17 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import logging
+import threading
+import time
+
+from django.core.cache import cache
 
 import requests
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 
 API_URL = 'https://www.google.com/recaptcha/api/siteverify'
+CONNECT_TIMEOUT = 2  # seconds
+READ_TIMEOUT = 3  # seconds
+# Tokens expire two minutes after they are issued
+VERDICT_CACHE_TIMEOUT = 120  # seconds
+VERDICT_CACHE_PREFIX = 'recaptcha:verdict'
+LATENCY_HISTOGRAM_KEY = 'recaptcha:latency'
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5)  # seconds
 logger = logging.getLogger(__name__)
 
+_local = threading.local()
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='recaptcha')
+
+
+def get_session():
+    """
+    Return this thread's requests session, which keeps its connection to Google open
+    between verifications.
+    """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        _local.session = session
+    return session
+
 
 def verify(token, secret):
     # this is only used for the (card based) donate form,
     # as verifying in donate.recaptcha.fields.ReCaptchaField
+    #
+    # Google rejects a token the second time it's verified, so a double-submitted form
+    # gets the verdict from the first submission, once.
+    cache_key = f'{VERDICT_CACHE_PREFIX}:{hashlib.sha256(token.encode("utf-8")).hexdigest()}'
+    verdict = cache.get(cache_key)
+    if verdict is not None:
+        cache.delete(cache_key)
+        return verdict
+
+    start = time.monotonic()
     try:
-        response = requests.post(API_URL, timeout=5, data={
+        response = get_session().post(API_URL, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), data={
             'secret': secret,
             'response': token
         })
@@ -19,5 +61,41 @@ def verify(token, secret):
     except RequestException:
         logger.exception('Failed to make request to recaptcha API')
         return True
+    finally:
+        record_latency(time.monotonic() - start)
+
+    verdict = response.json()['success']
+    cache.set(cache_key, verdict, VERDICT_CACHE_TIMEOUT)
+    return verdict
+
+
+def verify_async(token, secret):
+    """
+    Start verifying the token in the background, and return a future for the result of verify().
+    """
+    return _executor.submit(verify, token, secret)
+
+
+def get_latency_bucket(seconds):
+    for bucket in LATENCY_BUCKETS:
+        if seconds <= bucket:
+            return str(bucket)
+    return '+Inf'
+
+
+def record_latency(seconds):
+    try:
+        get_redis_connection('default').hincrby(LATENCY_HISTOGRAM_KEY, get_latency_bucket(seconds), 1)
+    except RedisError:
+        logger.exception('Could not record recaptcha latency')
+
 
-    return response.json()['success']
+def get_latency_histogram():
+    """
+    Return {bucket: count} for each latency bucket, where bucket is the upper bound in seconds.
+    """
+    counts = get_redis_connection('default').hgetall(LATENCY_HISTOGRAM_KEY)
+    return {
+        bucket: int(counts.get(bucket.encode('utf-8'), 0))
+        for bucket in [str(bucket) for bucket in LATENCY_BUCKETS] + ['+Inf']
+    }
@@ -39,11 +39,21 @@ class Base(object):
     # Apple Pay Domain Association (for FundraiseUp)
     APPLE_PAY_DOMAIN_ASSOCIATION_KEY = env('APPLE_PAY_DOMAIN_ASSOCIATION_KEY')
 
+    # Full-page cache for anonymous visitors to donation pages
+    PAGE_CACHE_ENABLED = env('PAGE_CACHE_ENABLED')
+    PAGE_CACHE_TIMEOUT = env('PAGE_CACHE_TIMEOUT')
+
+    # Check card form postal codes against the format for their country
+    VALIDATE_POSTAL_CODE_FORMAT = env('VALIDATE_POSTAL_CODE_FORMAT')
+
     # Acoustic Configuration
     ACOUSTIC_TX_CLIENT_ID = env('ACOUSTIC_TX_CLIENT_ID')
     ACOUSTIC_TX_CLIENT_SECRET = env('ACOUSTIC_TX_CLIENT_SECRET')
     ACOUSTIC_TX_REFRESH_TOKEN = env('ACOUSTIC_TX_REFRESH_TOKEN')
     ACOUSTIC_TX_SERVER_NUMBER = env('ACOUSTIC_TX_SERVER_NUMBER')
+    # Send receipts in one request per campaign every ACOUSTIC_TX_BATCH_WINDOW seconds
+    ACOUSTIC_TX_BATCH_RECEIPTS = env('ACOUSTIC_TX_BATCH_RECEIPTS')
+    ACOUSTIC_TX_BATCH_WINDOW = env('ACOUSTIC_TX_BATCH_WINDOW')
     DONATION_RECEIPT_METHOD = env('DONATION_RECEIPT_METHOD')
 
     # Basket Configuration
@@ -151,20 +161,42 @@ class Base(object):
             'whitenoise.middleware.WhiteNoiseMiddleware',
             'donate.utility.middleware.TargetDomainRedirectMiddleware'
             if self.DOMAIN_REDIRECT_MIDDLEWARE_ENABLED else None,
-            'django.middleware.gzip.GZipMiddleware',
-            'django.contrib.sessions.middleware.SessionMiddleware',
-            'django.middleware.locale.LocaleMiddleware',
-            'django.middleware.common.CommonMiddleware',
-            'django.middleware.csrf.CsrfViewMiddleware',
-            'django.contrib.auth.middleware.AuthenticationMiddleware',
-            'django.contrib.messages.middleware.MessageMiddleware',
-            'django.middleware.clickjacking.XFrameOptionsMiddleware',
-            'wagtail.contrib.redirects.middleware.RedirectMiddleware',
-            'csp.middleware.CSPMiddleware',
-            # Make sure to check for deauthentication during a session:
-            'mozilla_django_oidc.middleware.SessionRefresh'
+            # Runs FULL_MIDDLEWARE, or LEAN_MIDDLEWARE for LEAN_MIDDLEWARE_PATHS
+            'donate.utility.middleware.MiddlewareProfileMiddleware',
         ]))
 
+    FULL_MIDDLEWARE = [
+        'django.middleware.gzip.GZipMiddleware',
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.locale.LocaleMiddleware',
+        'django.middleware.common.CommonMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+        'wagtail.contrib.redirects.middleware.RedirectMiddleware',
+        'csp.middleware.CSPMiddleware',
+        # Make sure to check for deauthentication during a session:
+        'mozilla_django_oidc.middleware.SessionRefresh'
+    ]
+
+    # Endpoints that only machines call (webhooks, environment.json and the Apple Pay
+    # domain association) need no sessions, translations, CSRF checks or logins
+    LEAN_MIDDLEWARE = [
+        'django.middleware.common.CommonMiddleware',
+    ]
+    LEAN_MIDDLEWARE_PATHS = [
+        '/braintree/webhook/',
+        '/stripe/webhook/',
+        '/environment.json',
+        '/.well-known/apple-developer-merchantid-domain-association',
+    ]
+
+    # The admin checks look for the session, auth and messages middleware in MIDDLEWARE, and
+    # the deploy checks look for the clickjacking (W002) and CSRF (W003) middleware there,
+    # but they're all in FULL_MIDDLEWARE. MiddlewareSettingsTestCase checks that they still are.
+    SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410', 'security.W002', 'security.W003']
+
     ROOT_URLCONF = 'donate.urls'
 
     TEMPLATES = defaults.TEMPLATES
@@ -7,9 +7,13 @@ class Braintree(object):
     BRAINTREE_PUBLIC_KEY = env('BRAINTREE_PUBLIC_KEY')
     BRAINTREE_PRIVATE_KEY = env('BRAINTREE_PRIVATE_KEY')
     BRAINTREE_TOKENIZATION_KEY = env('BRAINTREE_TOKENIZATION_KEY')
+    # How long a request to Braintree may take before the SDK gives up on it
+    BRAINTREE_TIMEOUT = env('BRAINTREE_TIMEOUT')
     BRAINTREE_MERCHANT_ACCOUNTS = env('BRAINTREE_MERCHANT_ACCOUNTS')
     BRAINTREE_PLANS = env('BRAINTREE_PLANS')
     BRAINTREE_MERCHANT_ACCOUNTS_PAYPAL_MICRO = env('BRAINTREE_MERCHANT_ACCOUNTS_PAYPAL_MICRO')
+    # Vault one-time card donations as part of the sale, instead of creating a customer first
+    BRAINTREE_VAULT_ON_SALE = env('BRAINTREE_VAULT_ON_SALE')
 
     USE_PAYPAL = env('USE_PAYPAL')
 
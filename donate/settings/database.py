@@ -2,12 +2,17 @@ from .environment import env
 
 
 class Database(object):
+    # Check that a persistent connection still works at the start of each request, see donate.core.db
+    DATABASE_CONN_HEALTH_CHECKS = env('DATABASE_CONN_HEALTH_CHECKS')
 
     @property
     def DATABASES(self):
         config = {
             'default': env.db_url_config(env('DATABASE_URL'))
         }
+        # Views that don't write to the database opt out with transaction.non_atomic_requests
         config['default']['ATOMIC_REQUESTS'] = True
+        # Keep connections open between requests, 0 closes them at the end of each request
+        config['default']['CONN_MAX_AGE'] = env('DATABASE_CONN_MAX_AGE')
 
         return config
@@ -24,10 +24,42 @@ class Redis(object):
                 'IGNORE_EXCEPTIONS': True,
                 "CONNECTION_POOL_KWARGS": connection_pool_kwargs
             }
-        }
+        },
+        # Errors aren't ignored here, donate.core.sessions handles them, so that a failed
+        # save isn't mistaken for a session key collision
+        'sessions': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'session',
+            'OPTIONS': {
+                'SOCKET_TIMEOUT': 5,
+                'SOCKET_CONNECT_TIMEOUT': 5,
+                'SERIALIZER': 'donate.core.sessions.CompactJSONSerializer',
+                "CONNECTION_POOL_KWARGS": connection_pool_kwargs
+            }
+        },
     }
 
+    # Sessions only live in Redis, and expire from it along with their cookie
+    SESSION_ENGINE = 'donate.core.sessions'
+    SESSION_CACHE_ALIAS = 'sessions'
+    SESSION_COOKIE_AGE = env('SESSION_COOKIE_AGE')
+
+    # Workers listen on these in order of priority, see donate/core/queues.py
     RQ_QUEUES = {
+        'high': {
+            'URL': REDIS_QUEUE_URL,
+            'DEFAULT_TIMEOUT': 500,
+        },
+        'normal': {
+            'URL': REDIS_QUEUE_URL,
+            'DEFAULT_TIMEOUT': 500,
+        },
+        'low': {
+            'URL': REDIS_QUEUE_URL,
+            'DEFAULT_TIMEOUT': 500,
+        },
+        # No longer used for new jobs, but still worked so that nothing queued before a deploy is lost
         'default': {
             'URL': REDIS_QUEUE_URL,
             'DEFAULT_TIMEOUT': 500,
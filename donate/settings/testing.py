@@ -36,6 +36,15 @@ class Testing(Base, Secure, Redis, OIDC, Database, Braintree, Configuration):
 
     HEROKU_APP_NAME = None
 
+    # CI has no Redis
+    CACHES = {
+        **Redis.CACHES,
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sessions',
+        },
+    }
+
     @classmethod
     def pre_setup(cls):
         super().pre_setup()
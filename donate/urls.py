@@ -38,8 +38,7 @@ if settings.ENABLE_THUNDERBIRD_REDIRECT:
     ) + urlpatterns
 
 urlpatterns += i18n_patterns(
-    # TODO we may want to version this cache, or pre-compile the catalog at build time
-    # See https://django-statici18n.readthedocs.io
+    # Only used when the catalogs haven't been precompiled, see the compile_js_catalogs command
     path('jsi18n/', cache_page(86400)(JavaScriptCatalog.as_view()), name='javascript-catalog'),
     path('', include(payments_urls)),
     # Ways to give view is commented out as we are now hosting that page on foundation.mozilla.org.
@@ -1,17 +1,30 @@
+from collections import defaultdict
+from datetime import timedelta
+import json
 import logging
-import sched
-from time import time, sleep
+import random
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.encoding import force_bytes
 
+from django_redis import get_redis_connection
 from lxml import etree
+from redis.exceptions import RedisError
 from requests import ConnectionError, ReadTimeout
 from silverpop.api import Silverpop, SilverpopResponseException
 
+from donate.core.queues import enqueue_in
+
 
 logger = logging.getLogger(__name__)
 XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
-schedule = sched.scheduler(time, sleep)
+
+SEND_RETRIES = 3
+SEND_RETRY_DELAY = 10  # seconds
+# Receipts waiting to be sent in the next batch, as a Redis list of JSON documents
+PENDING_MAIL_KEY = 'acoustic:pending_mail'
+# Maximum number of RECIPIENT elements sent in one XTMAILING document
+MAX_BATCH_RECIPIENTS = 100
 
 
 def process_response(resp):
@@ -28,9 +41,32 @@ def process_response(resp):
     return response
 
 
-def process_tx_response(resp):
+def process_tx_response(resp, per_recipient=False):
+    """
+    Parse an XTMail response, raising if Acoustic reported an error.
+
+    With per_recipient=True (used for batched sends) errors reported against
+    individual recipients are returned as an {email: error} dict alongside the
+    response instead, so that one bad address doesn't fail the whole batch.
+    """
     logger.debug("Response: %s" % resp.text)
     response = etree.fromstring(resp.text.encode("utf-8"))
+    if per_recipient:
+        recipient_errors = {}
+        for detail in response.findall(".//RECIPIENT_DETAIL"):
+            error = detail.findtext("ERROR_STRING")
+            if error:
+                email = detail.findtext("EMAIL")
+                logger.error(f'Error while sending donation receipt to Acoustic for {email}: {error}')
+                recipient_errors[email] = error
+
+        error = response.findtext("ERROR_STRING")
+        if error and not recipient_errors:
+            logger.error(f'Error while sending donation receipts to Acoustic: {error}')
+            raise SilverpopResponseException(error)
+
+        return response, recipient_errors
+
     errors = response.findall(".//ERROR_STRING")
     if errors:
         for e in errors:
@@ -52,27 +88,12 @@ def xml_tag(tag, value=None, cdata=False, **attrs):
     return xmlt
 
 
-def transact_xml(to, campaign_id, fields=None, bcc=None, save_to_db=False):
-    fields = fields or {}
+def recipient_xml(to, fields, bcc=None):
     bcc = bcc or []
     if isinstance(bcc, str):
         bcc = [bcc]
 
-    root = xml_tag("XTMAILING")
-    root.append(xml_tag("CAMPAIGN_ID", campaign_id))
-    if "transaction_id" in fields:
-        root.append(xml_tag("TRANSACTION_ID", fields["transaction_id"]))
-
-    root.append(xml_tag("SEND_AS_BATCH", "false"))
-    root.append(xml_tag("NO_RETRY_ON_FAILURE", "false"))
-    if fields and save_to_db:
-        save_cols_tag = xml_tag("SAVE_COLUMNS")
-        root.append(save_cols_tag)
-        for name in fields:
-            save_cols_tag.append(xml_tag("COLUMN_NAME", name))
-
     recipient_tag = xml_tag("RECIPIENT")
-    root.append(recipient_tag)
     recipient_tag.append(xml_tag("EMAIL", to))
     for addr in bcc:
         recipient_tag.append(xml_tag("BCC", addr))
@@ -83,6 +104,52 @@ def transact_xml(to, campaign_id, fields=None, bcc=None, save_to_db=False):
         p_tag.append(xml_tag("VALUE", value))
         recipient_tag.append(p_tag)
 
+    return recipient_tag
+
+
+def save_columns_xml(names):
+    save_cols_tag = xml_tag("SAVE_COLUMNS")
+    for name in names:
+        save_cols_tag.append(xml_tag("COLUMN_NAME", name))
+
+    return save_cols_tag
+
+
+def transact_xml(to, campaign_id, fields=None, bcc=None, save_to_db=False):
+    fields = fields or {}
+
+    root = xml_tag("XTMAILING")
+    root.append(xml_tag("CAMPAIGN_ID", campaign_id))
+    if "transaction_id" in fields:
+        root.append(xml_tag("TRANSACTION_ID", fields["transaction_id"]))
+
+    root.append(xml_tag("SEND_AS_BATCH", "false"))
+    root.append(xml_tag("NO_RETRY_ON_FAILURE", "false"))
+    if fields and save_to_db:
+        root.append(save_columns_xml(fields))
+
+    root.append(recipient_xml(to, fields, bcc))
+
+    return XML_HEADER + etree.tostring(root, encoding="unicode")
+
+
+def transact_batch_xml(campaign_id, recipients, save_to_db=False):
+    """
+    Build a single XTMAILING document for several recipients of the same campaign.
+    `recipients` is a list of (email, fields) tuples.
+    """
+    root = xml_tag("XTMAILING")
+    root.append(xml_tag("CAMPAIGN_ID", campaign_id))
+    root.append(xml_tag("SEND_AS_BATCH", "true"))
+    root.append(xml_tag("NO_RETRY_ON_FAILURE", "false"))
+    if save_to_db:
+        column_names = list(dict.fromkeys(name for __, fields in recipients for name in fields))
+        if column_names:
+            root.append(save_columns_xml(column_names))
+
+    for to, fields in recipients:
+        root.append(recipient_xml(to, fields))
+
     return XML_HEADER + etree.tostring(root, encoding="unicode")
 
 
@@ -117,36 +184,101 @@ class AcousticTransact(Silverpop):
         )
         return process_tx_response(response)
 
-    def send_mail(self, to, campaign_id, fields=None, bcc=None, save_to_db=False):
+    def attempt_send_mail_batch(self, campaign_id, recipients, save_to_db):
+        xml = transact_batch_xml(campaign_id, recipients, save_to_db)
+        logger.debug("Request: %s" % xml)
+        response = self.session.post(
+            self.api_xt_endpoint, data=force_bytes(xml), timeout=10,
+        )
+        return process_tx_response(response, per_recipient=True)
+
+    def send_mail(self, to, campaign_id, fields=None, bcc=None, save_to_db=False, attempt=0):
         # If we are testing, do not send emails
         if settings.TESTING:
             return
 
-        send_retries = 3
-        send_mail_immediately = 0  # seconds
-        send_mail_delay = 10  # seconds
-        schedule_priority = 1
-        call_args = (to, campaign_id, fields, bcc, save_to_db)
-
-        for attempt in range(send_retries):
-            if attempt == 0:
-                schedule.enter(send_mail_immediately, schedule_priority, self.attempt_send_mail, call_args)
-            else:
-                schedule.enter(send_mail_delay, schedule_priority, self.attempt_send_mail, call_args)
-            try:
-                # explicitly block, just in case the implicit behaviour changes in the future
-                schedule.run(blocking=True)
+        try:
+            self.attempt_send_mail(to, campaign_id, fields, bcc, save_to_db)
+        except (ConnectionError, ReadTimeout) as err:
+            schedule_retry(retry_send_mail, attempt, err, to, campaign_id, fields, bcc, save_to_db)
+
+    def send_mail_batch(self, campaign_id, recipients, save_to_db=False, attempt=0):
+        """
+        Send the same campaign to several recipients in one request. Returns
+        a dict of {email: error} for recipients that Acoustic refused.
+        """
+        # If we are testing, do not send emails
+        if settings.TESTING:
+            return {}
+
+        try:
+            __, recipient_errors = self.attempt_send_mail_batch(campaign_id, recipients, save_to_db)
+        except (ConnectionError, ReadTimeout) as err:
+            schedule_retry(retry_send_mail_batch, attempt, err, campaign_id, recipients, save_to_db)
+            return {}
+
+        return recipient_errors
+
+    def queue_mail(self, to, campaign_id, fields=None, save_to_db=False):
+        """
+        Add an email to the pending batch for its campaign. The first email added
+        to an empty batch schedules a flush after ACOUSTIC_TX_BATCH_WINDOW seconds.
+        """
+        item = json.dumps({
+            'to': to,
+            'campaign_id': campaign_id,
+            'fields': fields or {},
+            'save_to_db': save_to_db,
+        }, cls=DjangoJSONEncoder)
+        try:
+            pending = get_redis_connection('default').rpush(PENDING_MAIL_KEY, item)
+        except RedisError:
+            logger.exception('Could not add email to the Acoustic batch, sending it straight away')
+            return self.send_mail(to, campaign_id, fields, save_to_db=save_to_db)
+
+        if pending == 1:
+            enqueue_in(
+                timedelta(seconds=settings.ACOUSTIC_TX_BATCH_WINDOW),
+                flush_pending_mail,
+            )
+
+    def pop_pending_mail(self):
+        """
+        Remove and return up to MAX_BATCH_RECIPIENTS pending emails, oldest first.
+        """
+        pipeline = get_redis_connection('default').pipeline()
+        pipeline.lrange(PENDING_MAIL_KEY, 0, MAX_BATCH_RECIPIENTS - 1)
+        pipeline.ltrim(PENDING_MAIL_KEY, MAX_BATCH_RECIPIENTS, -1)
+        items, __ = pipeline.execute()
+        return [json.loads(item) for item in items]
+
+    def flush_pending_mail(self):
+        """
+        Send every pending email, taking one batch off the list at a time and sending
+        each batch as one request per campaign (and so per language, since each receipt
+        language is its own campaign). A request that fails is retried from its own job,
+        so that a failure doesn't lose the receipts already taken off the list.
+        """
+        sent = 0
+        while True:
+            mails = self.pop_pending_mail()
+            if not mails:
                 break
-            except (ConnectionError, ReadTimeout) as err:
-                if attempt != 2:
-                    logger.error("Error connecting to Acoustic while sending email receipt. Trying again.")
-                else:
-                    logger.error(
-                        f"Could not send email receipt. Unable to connect to Acoustic after {send_retries} retries."
-                    )
-                    logger.error(f"Error: {err}")
 
-                continue
+            batches = defaultdict(list)
+            for mail in mails:
+                batches[(mail['campaign_id'], mail['save_to_db'])].append((mail['to'], mail['fields']))
+
+            for (campaign_id, save_to_db), recipients in batches.items():
+                try:
+                    self.send_mail_batch(campaign_id, recipients, save_to_db)
+                except Exception as err:
+                    logger.exception(f'Could not send {len(recipients)} email(s) to Acoustic')
+                    schedule_retry(retry_send_mail_batch, 0, err, campaign_id, recipients, save_to_db)
+
+            sent += len(mails)
+
+        logger.info(f'Sent {sent} pending email(s) to Acoustic')
 
 
 acoustic_tx = AcousticTransact(
@@ -155,3 +287,29 @@ acoustic_tx = AcousticTransact(
     refresh_token=settings.ACOUSTIC_TX_REFRESH_TOKEN,
     server_number=settings.ACOUSTIC_TX_SERVER_NUMBER,
 )
+
+
+def schedule_retry(func, attempt, err, *args):
+    """
+    Retry a failed send later from a new RQ job, rather than sleeping in this one.
+    """
+    if attempt + 1 >= SEND_RETRIES:
+        logger.error(f"Could not send email receipt. Unable to connect to Acoustic after {SEND_RETRIES} retries.")
+        logger.error(f"Error: {err}")
+        return
+
+    logger.error("Error connecting to Acoustic while sending email receipt. Trying again.")
+    delay = random.uniform(SEND_RETRY_DELAY / 2, SEND_RETRY_DELAY * 1.5)
+    enqueue_in(timedelta(seconds=delay), func, *args, attempt=attempt + 1)
+
+
+def retry_send_mail(to, campaign_id, fields, bcc, save_to_db, attempt):
+    acoustic_tx.send_mail(to, campaign_id, fields, bcc, save_to_db, attempt=attempt)
+
+
+def retry_send_mail_batch(campaign_id, recipients, save_to_db, attempt):
+    acoustic_tx.send_mail_batch(campaign_id, recipients, save_to_db, attempt=attempt)
+
+
+def flush_pending_mail():
+    acoustic_tx.flush_pending_mail()
@@ -1,5 +1,8 @@
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
 from django.http.response import HttpResponseRedirectBase
 from django.conf import settings
+from django.utils.module_loading import import_string
 
 hostnames = settings.TARGET_DOMAINS
 
@@ -27,3 +30,80 @@ class TargetDomainRedirectMiddleware:
         )
 
         return HttpResponseTemporaryRedirect(redirect_url)
+
+
+class MiddlewareChain:
+    """
+    A chain of middleware around get_response, built the way Django builds MIDDLEWARE.
+    """
+
+    def __init__(self, middleware_paths, get_response):
+        self.view_middleware = []
+        self.template_response_middleware = []
+        self.exception_middleware = []
+
+        handler = get_response
+        for middleware_path in reversed(middleware_paths):
+            try:
+                middleware = import_string(middleware_path)(handler)
+            except MiddlewareNotUsed:
+                continue
+
+            if hasattr(middleware, 'process_view'):
+                self.view_middleware.insert(0, middleware.process_view)
+            if hasattr(middleware, 'process_template_response'):
+                self.template_response_middleware.append(middleware.process_template_response)
+            if hasattr(middleware, 'process_exception'):
+                self.exception_middleware.append(middleware.process_exception)
+            handler = convert_exception_to_response(middleware)
+
+        self.handler = handler
+
+    def __call__(self, request):
+        return self.handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for process_view in self.view_middleware:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response:
+                return response
+
+    def process_template_response(self, request, response):
+        for process_template_response in self.template_response_middleware:
+            response = process_template_response(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        for process_exception in self.exception_middleware:
+            response = process_exception(request, exception)
+            if response:
+                return response
+
+
+class MiddlewareProfileMiddleware:
+    """
+    Run settings.LEAN_MIDDLEWARE for the paths in settings.LEAN_MIDDLEWARE_PATHS, and
+    settings.FULL_MIDDLEWARE for everything else. Django calls the process_view,
+    process_template_response and process_exception hooks on this middleware, which
+    passes them on to the chain for the request's path.
+    """
+
+    def __init__(self, get_response):
+        self.full_chain = MiddlewareChain(settings.FULL_MIDDLEWARE, get_response)
+        self.lean_chain = MiddlewareChain(settings.LEAN_MIDDLEWARE, get_response)
+        self.lean_paths = frozenset(settings.LEAN_MIDDLEWARE_PATHS)
+
+    def get_chain(self, request):
+        return self.lean_chain if request.path_info in self.lean_paths else self.full_chain
+
+    def __call__(self, request):
+        return self.get_chain(request)(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        return self.get_chain(request).process_view(request, view_func, view_args, view_kwargs)
+
+    def process_template_response(self, request, response):
+        return self.get_chain(request).process_template_response(request, response)
+
+    def process_exception(self, request, exception):
+        return self.get_chain(request).process_exception(request, exception)
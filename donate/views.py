@@ -1,12 +1,33 @@
+import functools
+import hashlib
+import json
+
 from django.conf import settings
-from django.http import JsonResponse, HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.http import require_GET
 from django.views.generic.base import RedirectView
 from django.shortcuts import render
 from donate.payments import constants
 
+ENV_VARIABLES_MAX_AGE = 60 * 60  # seconds
+
 
+@functools.lru_cache(maxsize=None)
+def get_env_variables_content():
+    """
+    Return the JSON that EnvVariablesView serves, and its ETag. settings.FRONTEND
+    only changes with a deploy, so this is built once per process.
+    """
+    content = json.dumps(settings.FRONTEND, cls=DjangoJSONEncoder).encode('utf-8')
+    return content, f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
 class EnvVariablesView(View):
     """
     A view that permits a GET to expose whitelisted environment
@@ -14,7 +35,14 @@ class EnvVariablesView(View):
     """
 
     def get(self, request):
-        return JsonResponse(settings.FRONTEND)
+        content, etag = get_env_variables_content()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type='application/json')
+
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=ENV_VARIABLES_MAX_AGE)
+        return response
 
 
 class WaysToGiveView(View):
@@ -31,6 +59,7 @@ class WaysToGiveView(View):
         })
 
 
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
 class ThunderbirdRedirectView(RedirectView):
     """
     A view that redirects requests to give.thunderbird.net, preserving query params
@@ -42,6 +71,7 @@ class ThunderbirdRedirectView(RedirectView):
 
 
 @require_GET
+@transaction.non_atomic_requests
 def apple_pay_domain_association_view(request):
     """
     Returns string needed for Apple Pay domain association/verification
@@ -15,3 +15,8 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "donate.settings")
 os.environ.setdefault("DJANGO_CONFIGURATION", "Development")
 
 application = get_wsgi_application()
+
+# Build per-process caches now, rather than during the first requests that need them
+from donate.core.warmup import warm_caches  # noqa: E402
+
+warm_caches()